@@ -0,0 +1,48 @@
+"""对比 cast_value 新旧实现的单元格转换耗时: PYTHONPATH=. python benchmarks/bench_cast_value.py"""
+import re
+import timeit
+
+import yaml
+
+from filez.utils import BOOL_MAP, cast_value
+
+
+def legacy_cast_value(value: str):
+    value = value.strip()
+    if value.startswith("'") and value.endswith("'") or value.startswith('"') and value.endswith('"'):
+        return value.strip("'").strip('"')
+    if value.lower() in BOOL_MAP:
+        return BOOL_MAP[value.lower()]
+    if re.fullmatch(r'-?\d+', value):
+        return int(value)
+    if re.fullmatch(r'-?\d+\.\d+', value):
+        return float(value)
+    if (value.startswith('{') and value.endswith('}')) or (value.startswith('[') and value.endswith(']')):
+        return yaml.safe_load(value)
+    if ',' in value:
+        return [legacy_cast_value(v) for v in re.split(r'\s*,\s*', value)]
+    return value
+
+
+CELLS = {
+    'int': [str(i) for i in range(1000)],
+    'float': [f'{i}.5' for i in range(1000)],
+    'bool': ['true', 'false', 'on', 'off', 'null'] * 200,
+    'enum': ['pending', 'done', 'failed', 'running'] * 250,
+    'text': [f'user-{i}@example.com' for i in range(1000)],
+    'list': ['[1, 2, 3]', '{"a": 1, "b": [true, null]}'] * 500,
+}
+
+
+def main(number=20):
+    for name, cells in CELLS.items():
+        assert [cast_value(v) for v in cells] == [legacy_cast_value(v) for v in cells], name
+        legacy = timeit.timeit(lambda: [legacy_cast_value(v) for v in cells], number=number)
+        current = timeit.timeit(lambda: [cast_value(v) for v in cells], number=number)
+        per_cell = number * len(cells)
+        print(f'{name:<6} legacy {legacy / per_cell * 1e9:8.0f} ns/cell   '
+              f'current {current / per_cell * 1e9:8.0f} ns/cell   x{legacy / current:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""对比 datetime_hook 新旧实现加载大型 .har 文件的耗时: PYTHONPATH=. python benchmarks/bench_datetime_hook.py"""
+import datetime
+import json
+import os
+import re
+import tempfile
+import timeit
+
+from filez import file
+from filez.json_encoder import ISO_DATE_PATTERN
+
+LEGACY_DATETIME_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?$')
+
+
+def legacy_datetime_hook(dct: dict) -> dict:
+    for k, v in dct.items():
+        if isinstance(v, str):
+            if LEGACY_DATETIME_PATTERN.fullmatch(v):
+                try:
+                    dct[k] = datetime.datetime.fromisoformat(v)
+                except ValueError:
+                    pass
+            elif ISO_DATE_PATTERN.fullmatch(v):
+                try:
+                    dct[k] = datetime.date.fromisoformat(v)
+                except ValueError:
+                    pass
+    return dct
+
+
+def make_har(entries=20000) -> dict:
+    headers = [{'name': name, 'value': value} for name, value in
+               [('Accept', 'text/html'), ('User-Agent', 'Mozilla/5.0'), ('Cache-Control', 'no-cache'),
+                ('Date', 'Sun, 01 Jun 2025 12:30:45 GMT'), ('Content-Type', 'application/json')]]
+    return {'log': {'version': '1.2', 'creator': {'name': 'bench', 'version': '1.0'}, 'entries': [
+        {'startedDateTime': f'2025-06-01T12:{i % 60:02d}:{i % 60:02d}.123',
+         'time': i * 0.5,
+         'request': {'method': 'GET', 'url': f'https://example.com/api/items/{i}?page={i % 10}',
+                     'httpVersion': 'HTTP/1.1', 'headers': headers, 'queryString': [], 'cookies': []},
+         'response': {'status': 200, 'statusText': 'OK', 'headers': headers,
+                      'content': {'size': 1024, 'mimeType': 'application/json', 'text': '{"id": %d}' % i}},
+         'timings': {'send': 0, 'wait': 12, 'receive': 3}}
+        for i in range(entries)]}}
+
+
+def main(number=3):
+    fd, path = tempfile.mkstemp(suffix='.har')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(make_har(), f)
+    try:
+        def load_legacy():
+            with open(path) as f:
+                return json.load(f, object_hook=legacy_datetime_hook)
+
+        assert file.load(path, parse_datetime=True) == load_legacy()
+        cases = {
+            'no hook': lambda: file.load(path),
+            'legacy hook': load_legacy,
+            'datetime_hook': lambda: file.load(path, parse_datetime=True),
+            'datetime_keys': lambda: file.load(path, parse_datetime=True, datetime_keys=['startedDateTime']),
+            'datetime_paths': lambda: file.load(path, parse_datetime=True,
+                                                datetime_paths=['log.entries.*.startedDateTime']),
+        }
+        for name, func in cases.items():
+            seconds = timeit.timeit(func, number=number) / number
+            print(f'{name:<15} {seconds * 1000:8.1f} ms')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""对比 HtmlParser dict 节点与 HtmlNode 节点的内存占用: PYTHONPATH=. python benchmarks/bench_html_node.py [行数]"""
+import sys
+import tracemalloc
+
+from filez.html_parser import HtmlParser
+
+
+def make_page(rows):
+    cells = ''.join(f'<td>{j}</td>' for j in range(5))
+    body = ''.join(f'<tr class="row"><td><a href="/item/{i}">item {i}</a></td>{cells}<td><br></td></tr>'
+                   for i in range(rows))
+    return f'<html><head><title>report</title></head><body><table>{body}</table></body></html>'
+
+
+def measure(page, compact):
+    tracemalloc.start()
+    parser = HtmlParser(compact=compact)
+    parser.feed(page)
+    parser.close()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, parser
+
+
+def main(rows=20000):
+    page = make_page(rows)
+    nodes = page.count('<') - page.count('</')
+    for name, compact in [('dict', False), ('HtmlNode', True)]:
+        size, parser = measure(page, compact)
+        print(f'{name:<9} {size / 1e6:7.1f} MB  {size / nodes:6.0f} B/node  (source {len(page) / 1e6:.1f} MB)')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
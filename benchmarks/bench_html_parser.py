@@ -0,0 +1,35 @@
+"""HtmlParser 异常输入下的耗时随输入规模变化 (应为线性): PYTHONPATH=. python benchmarks/bench_html_parser.py"""
+import sys
+import time
+
+from filez.html_parser import HtmlParser
+
+PATTERNS = {
+    'unclosed div': '<div>',
+    'stray end tags': '<span></div></p>',
+    'unclosed li in list': '<li><ul><i></li>',
+    'implicit p close': '<p>text<div>',
+    'table soup': '<table><tr><td>1<td>2',
+    'nested select': '<select><option>a<optgroup><option>b',
+    'table in p': '<p><table><td>',
+}
+
+
+def parse_time(html):
+    start = time.perf_counter()
+    parser = HtmlParser()
+    parser.feed(html)
+    parser.close()
+    return time.perf_counter() - start
+
+
+def main(base=10000):
+    sizes = [base, base * 10]
+    print(f'{"pattern":<22}' + ''.join(f'{size:>12}' for size in sizes) + '   ratio')
+    for name, pattern in PATTERNS.items():
+        times = [parse_time(pattern * size) for size in sizes]
+        print(f'{name:<22}' + ''.join(f'{t:11.3f}s' for t in times) + f'   x{times[1] / times[0]:.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
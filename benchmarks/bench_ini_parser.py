@@ -0,0 +1,65 @@
+"""对比 IniParser 单次扫描解析与旧的正则预处理的耗时: PYTHONPATH=. python benchmarks/bench_ini_parser.py"""
+import configparser
+import os
+import re
+import tempfile
+import timeit
+
+from filez import file
+from filez.ini_parser import IniParser
+
+
+class LegacyIniParser(IniParser):
+    def _read(self, fp, filename):
+        lines = []
+        for raw in fp:
+            line = re.sub(r'(?<!")(?<!\\)\s+[#;].*$', '', raw).rstrip()
+            if line:
+                lines.append(line + '\n')
+        configparser.ConfigParser._read(self, lines, filename)
+
+
+def make_ini(sections=200, options=200) -> str:
+    lines = []
+    for i in range(sections):
+        lines.append(f'[section{i}]')
+        lines.append('; section comment')
+        for j in range(options):
+            if j % 10 == 0:
+                lines.append(f'option{j} = value {j} ; inline comment')
+            elif j % 10 == 1:
+                lines.append(f'option{j}: http://example.com/{j}')
+            elif j % 10 == 2:
+                lines.append(f'option{j} =\n    line 1\n    line 2  # comment')
+            else:
+                lines.append(f'option{j} = {j}')
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def read(parser_class, path):
+    parser = parser_class(parse_env=False, parse_value=False)
+    parser.read(path)
+    return parser
+
+
+def main(number=3):
+    fd, path = tempfile.mkstemp(suffix='.ini')
+    with os.fdopen(fd, 'w') as f:
+        f.write(make_ini())
+    try:
+        legacy_parser, parser = read(LegacyIniParser, path), read(IniParser, path)
+        assert legacy_parser.items_dict() == parser.items_dict()
+        print(f'{sum(len(parser.options(s)) for s in parser.sections())} options')
+        legacy = timeit.timeit(lambda: read(LegacyIniParser, path), number=number) / number
+        current = timeit.timeit(lambda: read(IniParser, path), number=number) / number
+        print(f'read      legacy {legacy * 1000:8.1f} ms   current {current * 1000:8.1f} ms   x{legacy / current:.1f}')
+        load = timeit.timeit(lambda: file.load_ini(path), number=number) / number
+        lazy = timeit.timeit(lambda: file.load_ini(path, lazy=True)['section0']['option0'], number=number) / number
+        print(f'load_ini  {load * 1000:8.1f} ms   lazy=True (读取一个值) {lazy * 1000:8.1f} ms')
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""对比各 JSON 后端加载及保存 .json/.har/.abi 文件的耗时: PYTHONPATH=. python benchmarks/bench_json_backend.py"""
+import os
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+from filez import Filez
+from filez.json_backend import JSON_BACKENDS, get_json_backend
+
+
+def make_json(count=20000) -> list:
+    start = datetime(2025, 6, 1)
+    return [{'id': i, 'name': f'user-{i}', 'score': i * 0.5, 'active': i % 2 == 0, 'tags': ['a', 'b', 'c'],
+             'created_at': start + timedelta(seconds=i)} for i in range(count)]
+
+
+def make_har(count=10000) -> dict:
+    headers = [{'name': 'Accept', 'value': 'application/json'}, {'name': 'User-Agent', 'value': 'Mozilla/5.0'}]
+    return {'log': {'version': '1.2', 'entries': [
+        {'startedDateTime': datetime(2025, 6, 1, 12, i % 60, i % 60), 'time': i * 0.5,
+         'request': {'method': 'GET', 'url': f'https://example.com/api/items/{i}', 'headers': headers},
+         'response': {'status': 200, 'headers': headers, 'content': {'size': 1024, 'text': '{"id": %d}' % i}}}
+        for i in range(count)]}}
+
+
+def make_abi(count=5000) -> list:
+    return [{'type': 'function', 'name': f'method{i}', 'stateMutability': 'view',
+             'inputs': [{'name': 'owner', 'type': 'address', 'internalType': 'address'},
+                        {'name': 'amount', 'type': 'uint256', 'internalType': 'uint256'}],
+             'outputs': [{'name': '', 'type': 'bool', 'internalType': 'bool'}]} for i in range(count)]
+
+
+def main(number=5):
+    backends = []
+    for name in JSON_BACKENDS:
+        try:
+            get_json_backend(name)
+            backends.append(name)
+        except ImportError:
+            print(f'{name} 未安装, 跳过')
+    tmp_dir = tempfile.mkdtemp()
+    files = {os.path.join(tmp_dir, f'data{ext}'): data
+             for ext, data in [('.json', make_json()), ('.har', make_har()), ('.abi', make_abi())]}
+    try:
+        for path, data in files.items():
+            expected = None
+            for name in backends:
+                file = Filez()
+                file.json_backend = name
+                file.save_json(data, path, json_backend=name)
+                loaded = file.load(path, parse_datetime=True)
+                expected = loaded if expected is None else expected
+                assert loaded == expected, name
+                save = timeit.timeit(lambda: file.save_json(data, path, json_backend=name), number=number) / number
+                load = timeit.timeit(lambda: file.load(path), number=number) / number
+                load_dt = timeit.timeit(lambda: file.load(path, parse_datetime=True), number=number) / number
+                print(f'{os.path.basename(path):<10} {name:<7} save {save * 1000:7.1f} ms   '
+                      f'load {load * 1000:7.1f} ms   load(parse_datetime) {load_dt * 1000:7.1f} ms')
+    finally:
+        for path in files:
+            os.remove(path)
+        os.rmdir(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
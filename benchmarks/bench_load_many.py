@@ -0,0 +1,41 @@
+"""对比逐个加载与 load_many 并发加载大量配置文件的耗时: PYTHONPATH=. python benchmarks/bench_load_many.py"""
+import json
+import os
+import shutil
+import tempfile
+import timeit
+
+from filez import file
+
+
+def make_files(tmp_dir, count=200) -> list:
+    paths = []
+    for i in range(count):
+        data = {'id': i, 'name': f'fixture-{i}', 'items': [{'key': f'k{j}', 'value': j} for j in range(200)]}
+        path = os.path.join(tmp_dir, f'fixture{i}.json' if i % 2 else f'fixture{i}.yaml')
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(data, f)
+            else:
+                file.save_yaml(data, path)
+        paths.append(path)
+    return paths
+
+
+def main(number=3):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        paths = make_files(tmp_dir)
+        assert [data for _, data, _ in file.load_many(paths)] == [file.load(path) for path in paths]
+        sequential = timeit.timeit(lambda: [file.load(path) for path in paths], number=number) / number
+        print(f'sequential          {sequential * 1000:8.1f} ms')
+        for executor in ('thread', 'process'):
+            seconds = timeit.timeit(lambda: file.load_many(paths, workers=os.cpu_count(), executor=executor),
+                                    number=number) / number
+            print(f'load_many {executor:<8}  {seconds * 1000:8.1f} ms')
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""对比 load_xlsx 完整加载与只读/流式加载耗时: PYTHONPATH=. python benchmarks/bench_load_xlsx.py [行数]"""
+import os
+import sys
+import tempfile
+import time
+
+import openpyxl
+
+from filez import file
+
+
+def make_workbook(file_path, rows, cols=10):
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet('Sheet1')
+    sheet.append([f'col{i}' for i in range(cols)])
+    for i in range(rows):
+        sheet.append([i * j if j % 2 else f'text-{i}-{j}' for j in range(cols)])
+    wb.save(file_path)
+
+
+def timed(name, func):
+    start = time.perf_counter()
+    result = func()
+    print(f'{name:<24} {time.perf_counter() - start:8.2f}s')
+    return result
+
+
+def main(rows=200000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'large.xlsx')
+        timed('generate', lambda: make_workbook(file_path, rows))
+        full = timed('load_xlsx', lambda: file.load(file_path, header=True))
+        read_only = timed('load_xlsx(read_only)', lambda: file.load(file_path, header=True, read_only=True))
+        count = timed('iter_xlsx', lambda: sum(1 for _ in file.load(file_path, header=True, stream=True)))
+        assert full == read_only and count == len(full)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,28 @@
+"""对比 load_yaml 纯 Python 与 libyaml 解析耗时: PYTHONPATH=. python benchmarks/bench_load_yaml.py [条目数]"""
+import os
+import sys
+import tempfile
+import timeit
+
+from filez import file
+
+
+def make_yaml(file_path, items):
+    with open(file_path, 'w') as f:
+        for i in range(items):
+            f.write(f'item{i}:\n  id: {i}\n  name: user-{i}\n  score: {i * 0.5}\n'
+                    f'  tags: [a, b, c]\n  enabled: true\n  home: ${{HOME:-/root}}/item{i}\n')
+
+
+def main(items=20000, number=3):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_path = os.path.join(tmp_dir, 'large.yaml')
+        make_yaml(file_path, items)
+        assert file.load(file_path, use_libyaml=True) == file.load(file_path, use_libyaml=False)
+        python = timeit.timeit(lambda: file.load(file_path, use_libyaml=False), number=number) / number
+        libyaml = timeit.timeit(lambda: file.load(file_path, use_libyaml=True), number=number) / number
+        print(f'SafeLoader  {python:6.2f}s\nCSafeLoader {libyaml:6.2f}s  x{python / libyaml:.1f}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,59 @@
+"""对比 parse_xml_node 递归实现与显式栈实现: PYTHONPATH=. python benchmarks/bench_parse_xml_node.py"""
+import sys
+import time
+from xml.etree import ElementTree
+
+from filez.xml_parser import parse_xml_node
+
+
+def legacy_parse_xml_node(node, ignore_attrs=False, attr_key_prefix=':', child_tag_key_prefix='',
+                          default_text_key='text', empty_text=None):
+    children = list(node)
+    key = child_tag_key_prefix + node.tag
+    text = node.text or empty_text
+    node_data_value = {attr_key_prefix + k: v for k, v in node.attrib.items()} if not ignore_attrs and node.attrib else {}
+
+    if not children:
+        if ignore_attrs or not node.attrib:
+            return {key: text}
+        return {**node_data_value, default_text_key: text}
+
+    for child in children:
+        child_data = legacy_parse_xml_node(child, ignore_attrs=ignore_attrs, attr_key_prefix=attr_key_prefix,
+                                           child_tag_key_prefix=child_tag_key_prefix,
+                                           default_text_key=default_text_key, empty_text=empty_text)
+        child_key = child_tag_key_prefix + child.tag
+        child_value = child_data[child_key] if child_key in child_data.keys() else child_data
+        if child_key in node_data_value.keys():
+            child_value = child_data[child_key]
+            node_data_value[child_key] = [node_data_value[child_key]]
+            node_data_value[child_key].append(child_value)
+        else:
+            node_data_value[child_key] = child_value
+    return {key: node_data_value}
+
+
+def timed(name, func, root):
+    start = time.perf_counter()
+    try:
+        func(root)
+    except RecursionError:
+        print(f'{name:<32} RecursionError')
+        return
+    print(f'{name:<32} {time.perf_counter() - start:8.3f}s')
+
+
+def main(wide=100000, deep=10000):
+    wide_root = ElementTree.fromstring('<root>' + ''.join(f'<item id="{i}"><v>{i}</v></item>'
+                                                          for i in range(wide)) + '</root>')
+    deep_root = ElementTree.fromstring('<n>' * deep + 'leaf' + '</n>' * deep)
+    print(f'wide: {wide} siblings, deep: {deep} levels (recursion limit {sys.getrecursionlimit()})')
+    timed('legacy wide', legacy_parse_xml_node, wide_root)
+    timed('parse_xml_node wide', parse_xml_node, wide_root)
+    timed('legacy deep', legacy_parse_xml_node, deep_root)
+    timed('parse_xml_node deep', parse_xml_node, deep_root)
+    assert len(parse_xml_node(wide_root)['root']['item']) == wide
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,34 @@
+"""对比环境变量替换新旧实现的耗时: PYTHONPATH=. python benchmarks/bench_substitute_env.py"""
+import os
+import timeit
+
+from filez.env import VAR_PATTERN, snapshot_env, substitute_env
+
+
+def legacy_substitute_env(text: str) -> str:
+    def _repl(m) -> str:
+        var, _, default = m.groups()
+        return os.environ.get(var, default if default is not None else '')
+
+    return VAR_PATTERN.sub(_repl, text)
+
+
+VALUES = {
+    'plain': [f'value-{i}' for i in range(100)] * 10,
+    'template': [f'http://${{HOST:-localhost}}:${{PORT:-80}}/api/{i}' for i in range(100)] * 10,
+}
+
+
+def main(number=200):
+    env = snapshot_env()
+    for name, values in VALUES.items():
+        assert [substitute_env(v, env) for v in values] == [legacy_substitute_env(v) for v in values], name
+        legacy = timeit.timeit(lambda: [legacy_substitute_env(v) for v in values], number=number)
+        current = timeit.timeit(lambda: [substitute_env(v, env) for v in values], number=number)
+        per_value = number * len(values)
+        print(f'{name:<9} legacy {legacy / per_value * 1e9:8.0f} ns/value   '
+              f'current {current / per_value * 1e9:8.0f} ns/value   x{legacy / current:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,30 @@
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from functools import partial
+from itertools import islice
 from pathlib import Path
-from typing import Union, List
-from xml.etree import ElementTree
-
-from .excel_parser import load_xls, load_xlsx
-from .json_encoder import datetime_hook, DateTimeEncoder
+from typing import Any, Iterable, Iterator, Optional, Tuple, Union, List
+
+from .cache import DISK_CACHE_DIR, DISK_MAX_BYTES, MAX_BYTES, MAX_ENTRIES, DiskCache, ParseCache, make_cache_key
+from .csv_parser import SAMPLE_ROWS, apply_schema
+from .env import env_scope, get_env_vars, substitute_env_in
+from .excel_parser import iter_xlsx, load_xls, load_xlsx
+from .html_parser import HTML_CHUNK_SIZE, iter_html
+from .json_backend import get_json_backend
+from .json_encoder import (convert_datetime_paths, datetime_hook, decode_json_lines, make_datetime_hook,
+                           DateTimeEncoder)
 from .pem_parser import parse_pem_to_dict
 from .properties_parser import parse_properties
-from .utils import cast_value
+from .utils import cast_value, map_in_process_pool, to_columns
 from .vcard3_parser import parse_vcard3
-from .xml_parser import get_xml_children, parse_xml_node
+from .xml_parser import get_xml_children, iter_xml, parse_xml_file, parse_xml_node
+
+JSONL_BATCH_SIZE = 10000  # 进程池解码时每批的行数
+PROCESS_FILE_TYPES = {'xls', 'xlsx', 'xml', 'html', 'xmind'}  # 解析为 CPU 密集型, load_many 时默认使用进程池
+RAW_JSON_EXTS = {'.har', '.abi'}  # 抓包记录, 合约 ABI 等数据文件, 从不替换 ${VAR}
+ENV_FILE_TYPES = {'ini', 'yaml', 'json'}  # 支持替换 ${VAR} 的文件类型, JSON 需指定 parse_env=True
 
 FILE_TYPES = {
     '.ini': 'ini',
@@ -20,6 +34,8 @@ FILE_TYPES = {
     '.json': 'json',
     '.abi': 'json',
     '.har': 'json',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
     '.yaml': 'yaml',
     '.yml': 'yaml',
     '.csv': 'csv',
@@ -45,12 +61,17 @@ class Filez(object):
         self.parse_value = True  # auto cast int, float, bool, list, dict value
         self.parse_env = True
         self.parse_datetime = False
+        self.use_libyaml = True  # 安装了 libyaml 时使用 C 加速的 YAML 解析
+        self.env = None  # 替换 ${VAR} 使用的环境变量, 为 None 时每次加载使用当时 os.environ 的快照
+        self.json_backend = 'auto'  # 加载 JSON 的后端: auto/orjson/ujson/json, auto 时优先使用已安装的 orjson, ujson
         self.file_types = FILE_TYPES
+        self.cache = None  # 解析结果缓存, 使用 enable_cache() 开启
+        self.disk_cache = None  # 磁盘缓存, 使用 enable_disk_cache() 开启
 
     @property
     def yaml_loader(self):
         from .yaml_loader import get_yaml_loader
-        return get_yaml_loader(self, self.parse_env, self.parse_datetime)
+        return get_yaml_loader(self, self.parse_env, self.parse_datetime, self.use_libyaml)
 
     @property
     def ini_parser(self):
@@ -65,6 +86,21 @@ class Filez(object):
     def register(self, ext: str, file_type: str):
         self.file_types[ext] = file_type
 
+    def enable_cache(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES) -> ParseCache:
+        self.cache = ParseCache(max_entries=max_entries, max_bytes=max_bytes)
+        return self.cache
+
+    def disable_cache(self):
+        self.cache = None
+
+    def enable_disk_cache(self, cache_dir: Union[Path, str] = DISK_CACHE_DIR,
+                          max_bytes: int = DISK_MAX_BYTES) -> DiskCache:
+        self.disk_cache = DiskCache(cache_dir=cache_dir, max_bytes=max_bytes)
+        return self.disk_cache
+
+    def disable_disk_cache(self):
+        self.disk_cache = None
+
     @staticmethod
     def open(file_path: Union[Path, str], **kwargs) -> str:
         encoding = kwargs.pop('encoding', 'utf-8')
@@ -79,48 +115,116 @@ class Filez(object):
             data = [line.strip() for line in f.readlines()]
         return data
 
-    def load_csv(self, file_path: Union[Path, str], **kwargs) -> Union[List[list], List[dict]]:
+    def iter_csv(self, file_path: Union[Path, str], **kwargs) -> Iterator[Union[list, dict, List[list], List[dict]]]:
+        """逐行读取 CSV, 内存占用恒定; chunk_size>0 时按批次返回行列表"""
         import csv
         encoding = kwargs.pop('encoding', 'utf-8')
         header = kwargs.get('header', False)
         skip = kwargs.get('skip', 0)
-
-        with open(file_path, encoding=encoding) as f:
+        parse_value = kwargs.get('parse_value', self.parse_value)
+        chunk_size = kwargs.get('chunk_size', 0)
+        infer_schema = kwargs.get('infer_schema', False)
+        schema = kwargs.get('schema', None)
+        sample_rows = kwargs.get('sample_rows', SAMPLE_ROWS)
+        assert isinstance(skip, int) and skip >= 0
+        assert isinstance(chunk_size, int) and chunk_size >= 0
+
+        with open(file_path, encoding=encoding, newline='') as f:
             reader = csv.DictReader(f) if header else csv.reader(f)
             if skip > 0:
                 for _ in range(skip):  # 消耗掉前 N 行
                     next(reader, None)
-            if self.parse_value:
+            rows = reader
+            if infer_schema or schema:
+                rows = apply_schema(reader, schema=schema, infer=infer_schema, sample_rows=sample_rows,
+                                    parse_value=parse_value)
+            elif parse_value:
                 if header:
-                    return list(map(lambda line:
-                                    dict({key: cast_value(value)
-                                          for key, value in line.items()}), reader))
-                return list(map(lambda line: list(map(lambda value: cast_value(value),
-                                                      line)), reader))
-            return list(reader)
+                    rows = ({key: cast_value(value) for key, value in line.items()} for line in reader)
+                else:
+                    rows = ([cast_value(value) for value in line] for line in reader)
+            if chunk_size:
+                yield from iter(lambda: list(islice(rows, chunk_size)), [])
+            else:
+                yield from rows
+
+    def load_csv(self, file_path: Union[Path, str], **kwargs) -> Union[List[list], List[dict], Iterator, dict]:
+        if kwargs.pop('stream', False):
+            return self.iter_csv(file_path, **kwargs)
+        if kwargs.pop('columnar', False):  # {列名: 列数据}, 不带标题行时以列序号为 key
+            kwargs.pop('chunk_size', None)
+            return to_columns(self.iter_csv(file_path, **kwargs))
+        return list(self.iter_csv(file_path, **kwargs))
 
     def load_json(self, file_path: Union[Path, str], **kwargs) -> Union[dict, list]:
         encoding = kwargs.pop('encoding', 'utf-8')
-        parse_env = kwargs.pop('parse_env', self.parse_env) # todo
+        parse_env = kwargs.pop('parse_env', False)  # JSON 中的 ${...} 多为数据, 需显式指定 parse_env=True 才替换
+        env = kwargs.pop('env', None)
         parse_datetime = kwargs.pop('parse_datetime', self.parse_datetime)
+        datetime_keys = kwargs.pop('datetime_keys', None)  # 只转换指定 key 的值
+        datetime_paths = kwargs.pop('datetime_paths', None)  # 只转换指定路径的值, 如 log.entries.*.startedDateTime
+        backend = get_json_backend(kwargs.pop('json_backend', self.json_backend))
         with open(file_path, encoding=encoding) as f:
-            if parse_datetime:
-                return json.load(f, object_hook=datetime_hook, **kwargs)
-            return json.load(f, **kwargs)
+            text = f.read()
+        if parse_datetime and datetime_paths:
+            data = convert_datetime_paths(backend.loads(text, **kwargs), datetime_paths)
+        elif parse_datetime:
+            object_hook = make_datetime_hook(datetime_keys) if datetime_keys else datetime_hook
+            data = backend.loads(text, object_hook=object_hook, **kwargs)
+        else:
+            data = backend.loads(text, **kwargs)
+        parse_env = parse_env and os.path.splitext(str(file_path))[1] not in RAW_JSON_EXTS
+        if parse_env and '${' in text:  # 替换字符串值中的 ${VAR} / ${VAR:-default}
+            with env_scope(env, default=self.env) as env:
+                data = substitute_env_in(data, env)
+        return data
 
-    def load_yaml(self, file_path, **kwargs) -> Union[dict, list]:
-        import yaml
+    def iter_jsonl(self, file_path: Union[Path, str], **kwargs) -> Iterator[Union[dict, list]]:
+        """逐行解析 JSON Lines 文件, 跳过空行; chunk_size>0 时按批次返回, workers>1 时使用进程池分批解码"""
         encoding = kwargs.pop('encoding', 'utf-8')
-        if 'parse_env' in kwargs or 'parse_datetime' in kwargs:
-            parse_env = kwargs.pop('parse_env', self.parse_env)
-            parse_datetime = kwargs.pop('parse_datetime', self.parse_datetime)
-            from .yaml_loader import get_yaml_loader
-            yaml_loader = get_yaml_loader(self, parse_env, parse_datetime)
-        else:
-            yaml_loader = self.yaml_loader
+        parse_datetime = kwargs.pop('parse_datetime', self.parse_datetime)
+        chunk_size = kwargs.pop('chunk_size', 0)
+        workers = kwargs.pop('workers', None)
+        assert isinstance(chunk_size, int) and chunk_size >= 0
 
         with open(file_path, encoding=encoding) as f:
-            data = yaml.load(f, Loader=yaml_loader)
+            lines = (line for line in f if line.strip())
+            if workers and workers > 1:
+                batches = iter(lambda: list(islice(lines, chunk_size or JSONL_BATCH_SIZE)), [])
+                batches = map_in_process_pool(partial(decode_json_lines, parse_datetime=parse_datetime),
+                                              batches, workers)
+                if chunk_size:
+                    yield from batches
+                else:
+                    for batch in batches:
+                        yield from batch
+                return
+
+            object_hook = datetime_hook if parse_datetime else None
+            rows = (json.loads(line, object_hook=object_hook) for line in lines)
+            if chunk_size:
+                yield from iter(lambda: list(islice(rows, chunk_size)), [])
+            else:
+                yield from rows
+
+    def load_jsonl(self, file_path: Union[Path, str], **kwargs) -> Union[list, Iterator]:
+        if kwargs.pop('stream', False):
+            return self.iter_jsonl(file_path, **kwargs)
+        kwargs.pop('chunk_size', None)
+        return list(self.iter_jsonl(file_path, **kwargs))
+
+    def load_yaml(self, file_path, **kwargs) -> Union[dict, list]:
+        from .yaml_loader import get_yaml_loader, load_yaml
+        encoding = kwargs.pop('encoding', 'utf-8')
+        parse_env = kwargs.pop('parse_env', self.parse_env)
+        parse_datetime = kwargs.pop('parse_datetime', self.parse_datetime)
+        use_libyaml = kwargs.pop('use_libyaml', self.use_libyaml)
+        include_workers = kwargs.pop('include_workers', None)  # 并发加载 !file 引用的线程数
+        env = kwargs.pop('env', None)
+        yaml_loader = get_yaml_loader(self, parse_env, parse_datetime, use_libyaml)
+
+        with open(file_path, encoding=encoding) as f, env_scope(env, default=self.env):
+            data = load_yaml(f, yaml_loader, workers=include_workers)
         return data
 
     def load_ini(self, file_path: Union[Path, str], **kwargs) -> dict:
@@ -128,9 +232,14 @@ class Filez(object):
         parse_value = kwargs.pop('parse_value', self.parse_value)
         parse_env = kwargs.pop('parse_env', self.parse_env)
         parse_datetime = kwargs.pop('parse_datetime', self.parse_datetime)
+        lazy = kwargs.pop('lazy', False)
+        env = kwargs.pop('env', None)
         cfg = self.ini_parser(parse_value=parse_value, parse_env=parse_env, parse_datetime=parse_datetime, **kwargs)
         cfg.read(file_path, encoding=encoding)
-        data = cfg.items_dict()
+        with env_scope(env, default=self.env) as cfg.env:
+            if lazy:  # 值在首次访问时才解析
+                return cfg.lazy_items_dict()
+            data = cfg.items_dict()
         return data
 
     @staticmethod
@@ -138,34 +247,74 @@ class Filez(object):
         header = kwargs.get('header', False)
         skip = kwargs.get('skip', 0)
         sheets = kwargs.get('sheets', None)
-        data = load_xls(file_path, header=header, skip=skip, sheets=sheets)
+        columnar = kwargs.get('columnar', False)
+        workers = kwargs.get('workers', None)
+        data = load_xls(file_path, header=header, skip=skip, sheets=sheets, columnar=columnar, workers=workers)
         return data
 
     @staticmethod
-    def load_xlsx(file_path, **kwargs) -> list:
+    def iter_xlsx(file_path, **kwargs) -> Iterator:
         header = kwargs.get('header', False)
         skip = kwargs.get('skip', 0)
         sheets = kwargs.get('sheets', None)
-        data = load_xlsx(file_path, header=header, skip=skip, sheets=sheets)
+        return iter_xlsx(file_path, header=header, skip=skip, sheets=sheets)
+
+    @staticmethod
+    def load_xlsx(file_path, **kwargs) -> Union[list, dict, Iterator]:
+        if kwargs.get('stream', False):
+            return Filez.iter_xlsx(file_path, **kwargs)
+        header = kwargs.get('header', False)
+        skip = kwargs.get('skip', 0)
+        sheets = kwargs.get('sheets', None)
+        columnar = kwargs.get('columnar', False)
+        read_only = kwargs.get('read_only', False)
+        workers = kwargs.get('workers', None)
+        data = load_xlsx(file_path, header=header, skip=skip, sheets=sheets, columnar=columnar, read_only=read_only,
+                         workers=workers)
         return data
 
-    def load_xml(self, file_path: Union[Path, str], **kwargs) -> dict:
-        raw = self.open(file_path, **kwargs)
-        root = ElementTree.fromstring(raw)
+    @staticmethod
+    def iter_xml(file_path: Union[Path, str], tag: str, **kwargs) -> Iterator[Union[dict, str, None]]:
+        return iter_xml(file_path, tag, **kwargs)
+
+    def load_xml(self, file_path: Union[Path, str], **kwargs) -> Union[dict, Iterator]:
+        if kwargs.pop('stream', False):
+            return self.iter_xml(file_path, **kwargs)
+        encoding = kwargs.pop('encoding', None)  # 默认由 XML 声明决定编码, 指定时覆盖
+        root = parse_xml_file(file_path, encoding)
         data = parse_xml_node(root, **kwargs)
         return data
 
-    def load_html(self, file_path: Union[Path, str], **kwargs) -> dict:
-        raw = self.open(file_path, **kwargs)
-        parser = self.html_parser()
-        parser.feed(raw)
-        root = parser.data['children']
+    @staticmethod
+    def iter_html(file_path: Union[Path, str], tag: Optional[str] = None, attrs: Optional[dict] = None,
+                  **kwargs) -> Iterator[dict]:
+        encoding = kwargs.pop('encoding', 'utf-8')
+        chunk_size = kwargs.pop('chunk_size', HTML_CHUNK_SIZE)
+        compact = kwargs.pop('compact', False)
+        with open(file_path, encoding=encoding) as f:
+            yield from iter_html(f, tag, attrs, chunk_size=chunk_size, compact=compact)
+
+    def load_html(self, file_path: Union[Path, str], **kwargs) -> Union[dict, Iterator[dict]]:
+        if kwargs.pop('stream', False):
+            return self.iter_html(file_path, **kwargs)
+        encoding = kwargs.pop('encoding', 'utf-8')
+        chunk_size = kwargs.pop('chunk_size', HTML_CHUNK_SIZE)
+        compact = kwargs.pop('compact', False)  # 使用 HtmlNode 节点, 可通过 to_dict() 转换
+        parser = self.html_parser(compact=compact)
+        with open(file_path, encoding=encoding) as f:
+            for chunk in iter(lambda: f.read(chunk_size), ''):
+                parser.feed(chunk)
+        parser.close()
+        if compact:
+            root = [(item.tag, item.children or []) for item in parser.data.children or []]
+        else:
+            root = [(item['tag'], item['children']) for item in parser.data['children']]
         head, body = {}, {}
-        for item in root:
-            if item['tag'] == 'head':
-                head = item['children']
-            elif item['tag']  == 'body':
-                body = item['children']
+        for tag, children in root:
+            if tag == 'head':
+                head = children
+            elif tag == 'body':
+                body = children
         return {'head': head, 'body': body}
 
     def load_properties(self, file_path, **kwargs) -> dict:
@@ -190,7 +339,102 @@ class Filez(object):
         _, ext = os.path.splitext(file_path)
         file_type = self.file_types.get(ext, 'txt')
         load_method = getattr(self, f'load_{file_type}')
-        return load_method(file_path, **kwargs)
+        use_cache = kwargs.pop('cache', True)
+        with env_scope(kwargs.pop('env', None), default=self.env) as env:  # 本次加载 (包括 !file 引用) 使用同一个快照
+            if (self.cache is None and self.disk_cache is None) or not use_cache or kwargs.get('stream') \
+                    or kwargs.get('lazy'):
+                return load_method(file_path, **kwargs)
+
+            options = {'file_type': file_type, 'parse_value': self.parse_value, 'parse_env': self.parse_env,
+                       'parse_datetime': self.parse_datetime, **kwargs}
+            encoding = kwargs.get('encoding', 'utf-8')
+            includes = self.get_includes(file_path, encoding=encoding)
+            if file_type in ENV_FILE_TYPES and ext not in RAW_JSON_EXTS \
+                    and kwargs.get('parse_env', self.parse_env and file_type != 'json'):
+                # 只有文件 (及其 !file 引用的文件) 中引用的环境变量变化时才重新解析
+                names = {name for path in [file_path, *includes] for name in get_env_vars(path, encoding)}
+                options['env'] = sorted((name, env.get(name)) for name in names)
+
+            def loader():
+                return load_method(file_path, **kwargs)
+
+            if self.disk_cache is not None:
+                load_from_disk = loader
+
+                def loader():
+                    return self.disk_cache.get_or_load(file_path, options, load_from_disk, includes)
+
+            if self.cache is None:
+                return loader()
+            return self.cache.get_or_load(make_cache_key(file_path, options, includes), loader)
+
+    def get_includes(self, file_path: Union[Path, str], encoding: str = 'utf-8') -> List[str]:
+        """YAML 文件直接或间接通过 !file 引用的所有文件, 其他类型的文件返回空列表"""
+        from .yaml_loader import get_yaml_includes_cached
+        includes, stack = {}, [str(file_path)]
+        while stack:
+            path = stack.pop()
+            if self.file_types.get(os.path.splitext(path)[1]) != 'yaml' or not os.path.isfile(path):
+                continue
+            for include in get_yaml_includes_cached(path, encoding):
+                if include not in includes:
+                    includes[include] = None
+                    stack.append(include)
+        return list(includes)
+
+    def load_many(self, paths: Iterable[Union[Path, str]], workers: Optional[int] = None, executor: str = 'auto',
+                  ordered: bool = True, **kwargs) -> Union[List[Tuple[str, Any, Optional[Exception]]], Iterator]:
+        """并发加载多个文件, 单个文件加载失败不影响其他文件, 返回 [(文件路径, 数据, 异常)], 加载成功时异常为 None
+
+        executor: thread / process / auto, auto 时 PROCESS_FILE_TYPES 中的文件使用进程池, 其他文件 (I/O 密集型) 使用线程池
+        ordered=False 时返回按完成顺序产出结果的迭代器; kwargs 传给每个文件的 load
+        """
+        assert executor in ('auto', 'thread', 'process'), f'不支持的 executor: {executor!r}'
+        paths = [str(path) for path in paths]
+        with env_scope(kwargs.pop('env', None), default=self.env) as env:  # 所有文件使用同一个环境变量快照
+            kwargs['env'] = env
+        results = self._iter_load_many(paths, workers, executor, **kwargs)
+        if not ordered:
+            return (result for _, result in results)
+        data = [None] * len(paths)
+        for index, result in results:
+            data[index] = result
+        return data
+
+    def _iter_load_many(self, paths: List[str], workers: Optional[int], executor: str, **kwargs) -> Iterator[tuple]:
+        def use_process(path):
+            if executor != 'auto':
+                return executor == 'process'
+            return self.file_types.get(os.path.splitext(path)[1], 'txt') in PROCESS_FILE_TYPES
+
+        with ExitStack() as stack:
+            futures = {}
+            thread_pool = process_pool = None
+            for index, path in enumerate(paths):
+                if use_process(path):
+                    if process_pool is None:
+                        process_pool = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+                        settings = {key: value for key, value in vars(self).items() if key != 'cache'}
+                    future = process_pool.submit(_load_in_process, settings, path, kwargs)
+                else:
+                    if thread_pool is None:
+                        thread_pool = stack.enter_context(ThreadPoolExecutor(max_workers=workers))
+                    future = thread_pool.submit(self.load, path, **kwargs)
+                futures[future] = index
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield index, (paths[index], future.result(), None)
+                except Exception as e:
+                    yield index, (paths[index], None, e)
+
+    def watch(self, paths: Iterable[Union[Path, str]], callback, **kwargs) -> 'Watcher':
+        """加载文件并在后台线程中监听变化, 文件 (或其 !file 引用的文件) 变化后重新解析并调用 callback(路径, 新数据, diff)
+
+        kwargs: debounce, interval, use_inotify, error_callback 及传给 load 的参数, 调用返回值的 stop() 停止监听
+        """
+        from .watcher import Watcher
+        return Watcher(self, paths, callback, **kwargs).start()
 
     def load_xmind(self, file_path, **kwargs):
         from xmindparser import xmind_to_dict
@@ -204,8 +448,20 @@ class Filez(object):
 
     @staticmethod
     def save_json(data: Union[dict, list], file_path: Union[Path, str], **kwargs):
-        with open(file_path, 'w') as f:
-            json.dump(data, f, cls=DateTimeEncoder, **kwargs)
+        encoding = kwargs.pop('encoding', 'utf-8')
+        # 默认使用标准库, 输出格式不随是否安装了 orjson/ujson 变化
+        backend = get_json_backend(kwargs.pop('json_backend', 'json'))
+        with open(file_path, 'w', encoding=encoding) as f:
+            f.write(backend.dumps(data, **kwargs))
+
+    @staticmethod
+    def save_jsonl(data: Iterable[Union[dict, list]], file_path: Union[Path, str], **kwargs):
+        """每个元素写为一行 JSON, data 可以是生成器"""
+        encoding = kwargs.pop('encoding', 'utf-8')
+        with open(file_path, 'w', encoding=encoding) as f:
+            for item in data:
+                f.write(json.dumps(item, cls=DateTimeEncoder, **kwargs))
+                f.write('\n')
 
     @staticmethod
     def save_yaml(data: Union[dict, list], file_path: Union[Path, str]):
@@ -224,11 +480,20 @@ class Filez(object):
         output_file_path = str(output_file_path)
         if output_file_path.endswith('.json'):
             return self.save_json(data, output_file_path)
+        if output_file_path.endswith('.jsonl') or output_file_path.endswith('.ndjson'):
+            return self.save_jsonl(data, output_file_path)
         if output_file_path.endswith('.yml') or output_file_path.endswith('.yaml'):
             return self.save_yaml(data, output_file_path)
         if output_file_path.endswith('.toml'):
             return self.save_toml(data, output_file_path)
-        raise Exception('Output file format not support, only support json,yaml,toml')
+        raise Exception('Output file format not support, only support json,jsonl,yaml,toml')
+
+
+def _load_in_process(settings: dict, file_path: str, kwargs: dict):
+    """在子进程中使用与主进程相同配置的 Filez 实例加载文件"""
+    fz = Filez()
+    vars(fz).update(settings)
+    return fz.load(file_path, **kwargs)
 
 
 file = filez = Filez()
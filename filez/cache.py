@@ -0,0 +1,227 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Union
+
+MAX_ENTRIES = 128
+MAX_BYTES = 64 * 1024 * 1024
+DISK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'filez')
+DISK_MAX_BYTES = 1024 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_MISSING = object()
+
+
+def options_digest(options: dict) -> str:
+    """加载参数摘要, 跨进程稳定"""
+    return hashlib.sha256(repr(sorted((k, repr(v)) for k, v in options.items())).encode()).hexdigest()
+
+
+def file_signature(file_path: Union[Path, str]) -> tuple:
+    """(绝对路径, 修改时间, 文件大小), 文件不存在时修改时间及大小为 None"""
+    file_path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return file_path, None, None
+    return file_path, stat.st_mtime_ns, stat.st_size
+
+
+def make_cache_key(file_path: Union[Path, str], options: dict, dependencies: Iterable[Union[Path, str]] = ()) -> tuple:
+    """缓存 key: 绝对路径, 修改时间, 文件大小, 加载参数及依赖文件 (如 YAML 中 !file 引用的文件) 的签名"""
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    return (file_path, stat.st_mtime_ns, stat.st_size, options_digest(options),
+            tuple(file_signature(path) for path in dependencies))
+
+
+@lru_cache(maxsize=1024)
+def _file_digest(file_path: str, mtime_ns: int, size: int) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_digest(file_path: Union[Path, str]) -> str:
+    """文件内容摘要, 文件未变化 (路径, 修改时间, 大小相同) 时不重复计算"""
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    return _file_digest(file_path, stat.st_mtime_ns, stat.st_size)
+
+
+class ParseCache(object):
+    """进程内解析结果缓存, 按条目数及字节数 LRU 淘汰
+
+    结果以 pickle 序列化后保存, 每次命中返回新的副本, 调用方修改返回值不会影响缓存
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._data: Dict[Hashable, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            blob = self._data.get(key)
+            if blob is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if blob is not None:
+            return pickle.loads(blob)
+
+        data = loader()
+        try:
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):  # 无法序列化的结果不缓存
+            return data
+        self.put(key, blob)
+        return pickle.loads(blob)
+
+    def put(self, key: Hashable, blob: bytes):
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._data[key] = blob
+            self.size += len(blob)
+            while len(self._data) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._data), 'bytes': self.size,
+                    'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+
+class DiskCache(object):
+    """磁盘解析结果缓存, 以文件内容摘要及加载参数为 key, 使用 pickle 保存, 按总大小淘汰最久未使用的条目
+
+    写入先写临时文件再原子替换, 多个进程可同时读写同一缓存目录; 缓存目录应仅当前用户可写 (pickle 反序列化)
+    """
+
+    def __init__(self, cache_dir: Union[Path, str] = DISK_CACHE_DIR, max_bytes: int = DISK_MAX_BYTES):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get_path(self, file_path: Union[Path, str], options: dict,
+                 dependencies: Iterable[Union[Path, str]] = ()) -> str:
+        """以文件内容, 加载参数及依赖文件 (如 YAML 中 !file 引用的文件) 的内容计算缓存文件路径"""
+        digests = [file_digest(file_path)]
+        for path in dependencies:
+            try:
+                digests.append(f'{os.path.abspath(path)}={file_digest(path)}')
+            except OSError:  # 依赖文件不存在
+                digests.append(f'{os.path.abspath(path)}=')
+        key = hashlib.sha256(f'{":".join(digests)}:{options_digest(options)}'.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{key}.pickle')
+
+    def get_or_load(self, file_path: Union[Path, str], options: dict, loader: Callable[[], Any],
+                    dependencies: Iterable[Union[Path, str]] = ()) -> Any:
+        path = self.get_path(file_path, options, dependencies)
+        data = self._read(path)
+        if data is not _MISSING:
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = loader()
+        self._write(path, data)
+        return data
+
+    def _read(self, path: str) -> Any:
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except FileNotFoundError:
+            return _MISSING
+        except Exception:  # 缓存文件损坏, 删除后重新解析
+            self._remove(path)
+            return _MISSING
+        try:
+            os.utime(path)  # 以修改时间记录最近使用时间
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path: str, data: Any):
+        try:
+            blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):  # 无法序列化的结果不缓存
+            return
+        if len(blob) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+        except OSError:
+            self._remove(tmp_path)
+            return
+        self.evict()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _entries(self) -> list:
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.pickle'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # 已被其他进程删除
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, max_bytes: Optional[int] = None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        self.evict(max_bytes=0)
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries), 'max_bytes': self.max_bytes}
@@ -0,0 +1,113 @@
+import datetime
+import re
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Union
+
+from .json_encoder import ISO_DATE_PATTERN, ISO_DATETIME_PATTERN
+from .utils import BOOL_MAP, cast_value
+
+SAMPLE_ROWS = 1000
+NULL_VALUES = {'', '~', 'null', 'none'}
+BOOL_VALUES = {key: value for key, value in BOOL_MAP.items() if value is not None}
+INT_PATTERN = re.compile(r'-?\d+')
+FLOAT_PATTERN = re.compile(r'-?\d+\.\d+')
+
+SCHEMA_TYPES = {'int': int, 'float': float, 'bool': bool, 'str': str, 'datetime': datetime.datetime,
+                'none': None, 'null': None}
+
+
+def _parse_bool(text: str) -> bool:
+    return BOOL_VALUES[text.lower()]
+
+
+_PARSERS = {bool: _parse_bool, datetime.datetime: datetime.datetime.fromisoformat}
+
+
+def infer_column_type(values: Iterable[str]) -> Optional[type]:
+    """根据样本值推断列类型: int/float/bool/datetime/str, 全为空值时返回 None"""
+    kinds = set()
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        text = value.strip()
+        lower = text.lower()
+        if lower in NULL_VALUES:
+            continue
+        if lower in BOOL_VALUES:
+            kinds.add(bool)
+        elif INT_PATTERN.fullmatch(text):
+            kinds.add(int)
+        elif FLOAT_PATTERN.fullmatch(text):
+            kinds.add(float)
+        elif ISO_DATETIME_PATTERN.fullmatch(text) or ISO_DATE_PATTERN.fullmatch(text):
+            kinds.add(datetime.datetime)
+        else:
+            return str
+    if not kinds:
+        return None
+    if len(kinds) == 1:
+        return kinds.pop()
+    if kinds == {int, float}:
+        return float
+    return str
+
+
+def infer_csv_schema(rows: Iterable[Union[list, dict]]) -> Dict[Union[int, str], Optional[type]]:
+    """根据样本行推断每列类型, 列表行以列序号为 key, 字典行以标题为 key"""
+    columns = {}
+    for row in rows:
+        items = row.items() if isinstance(row, dict) else enumerate(row)
+        for key, value in items:
+            columns.setdefault(key, []).append(value)
+    return {key: infer_column_type(values) for key, values in columns.items()}
+
+
+def get_column_converter(col_type: Union[type, str, None, Callable[[str], Any]]) -> Callable[[str], Any]:
+    """生成列转换函数, 空值转为 None, 转换失败时回退到 cast_value"""
+    if isinstance(col_type, str):
+        col_type = SCHEMA_TYPES[col_type.lower()]
+    if col_type is str:
+        return lambda value: value
+    parse = _PARSERS.get(col_type, col_type)
+
+    def convert(value):
+        if not isinstance(value, str):
+            return value
+        text = value.strip()
+        if text.lower() in NULL_VALUES:
+            return None
+        if parse is None:
+            return cast_value(text)
+        try:
+            return parse(text)
+        except (ValueError, TypeError, KeyError):
+            return cast_value(text)
+
+    return convert
+
+
+def apply_schema(rows: Iterator[Union[list, dict]], schema: Optional[dict] = None, infer: bool = False,
+                 sample_rows: int = SAMPLE_ROWS, parse_value: bool = True) -> Iterator[Union[list, dict]]:
+    """按列类型转换行数据, infer=True 时先从前 sample_rows 行推断类型, schema 中指定的列优先"""
+    assert isinstance(sample_rows, int) and sample_rows > 0
+    sample = list(islice(rows, sample_rows)) if infer else []
+    col_types = infer_csv_schema(sample) if infer else {}
+    col_types.update(schema or {})
+    converters = {key: get_column_converter(col_type) for key, col_type in col_types.items()}
+    default = cast_value if parse_value else (lambda value: value)
+
+    rows = chain(sample, rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    rows = chain([first], rows)
+
+    if isinstance(first, dict):
+        for row in rows:
+            yield {key: converters.get(key, default)(value) for key, value in row.items()}
+    else:
+        row_converters = []
+        for row in rows:
+            if len(row) > len(row_converters):
+                row_converters.extend(converters.get(i, default) for i in range(len(row_converters), len(row)))
+            yield [convert(value) for convert, value in zip(row_converters, row)]
@@ -0,0 +1,145 @@
+"""${VAR} / ${VAR:-default} 环境变量替换, INI, YAML 及 JSON 加载共用
+
+- 不包含 ${ 的字符串直接返回, 不进行正则匹配
+- 每个不同的字符串只编译一次模板 (LRU 缓存), 之后替换只需拼接
+- 按不可变的环境变量快照 EnvSnapshot 替换, 同一次加载 (包括 !file 引用的文件) 使用同一个快照, 加载过程中修改环境变量不影响结果
+"""
+import os
+import re
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Iterator, Mapping, Optional, Tuple, Union
+
+VAR_PATTERN = re.compile(r'\$\{([A-Z_][A-Z0-9_]*)(:-([^}]*))?\}', re.I)
+TEMPLATE_CACHE_SIZE = 4096
+
+
+class EnvSnapshot(Mapping):
+    """环境变量的不可变快照, 默认为创建时的 os.environ"""
+    __slots__ = ('_data', '_hash')
+
+    def __init__(self, env: Optional[Mapping[str, str]] = None):
+        self._data = dict(os.environ if env is None else env)
+        self._hash = None
+
+    def __getitem__(self, key: str) -> str:
+        return self._data[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, EnvSnapshot):
+            return self._data == other._data
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(frozenset(self._data.items()))
+        return self._hash
+
+    def __repr__(self):
+        return f'EnvSnapshot({len(self._data)} variables)'
+
+
+def snapshot_env(env: Optional[Mapping[str, str]] = None) -> EnvSnapshot:
+    """获取环境变量快照, env 已是快照时直接返回"""
+    return env if isinstance(env, EnvSnapshot) else EnvSnapshot(env)
+
+
+_env_local = threading.local()
+
+
+@contextmanager
+def env_scope(env: Optional[Mapping[str, str]] = None,
+              default: Optional[Mapping[str, str]] = None) -> Iterator[EnvSnapshot]:
+    """设置当前线程加载使用的环境变量快照
+
+    未指定 env 时, 嵌套调用 (如 !file 引用) 沿用外层的快照, 最外层调用使用 default 或当前 os.environ 的快照
+    """
+    current = getattr(_env_local, 'env', None)
+    if env is None and current is not None:
+        yield current
+        return
+    _env_local.env = snapshot_env(default if env is None else env)
+    try:
+        yield _env_local.env
+    finally:
+        _env_local.env = current
+
+
+def current_env() -> Mapping[str, str]:
+    """当前线程 env_scope 中的快照, 不在 env_scope 中时为 os.environ"""
+    env = getattr(_env_local, 'env', None)
+    return os.environ if env is None else env
+
+
+@lru_cache(maxsize=1024)
+def _file_env_vars(file_path: str, mtime_ns: int, size: int, encoding: str) -> Tuple[str, ...]:
+    with open(file_path, encoding=encoding, errors='replace') as f:
+        return tuple(sorted({m.group(1) for m in VAR_PATTERN.finditer(f.read())}))
+
+
+def get_env_vars(file_path: str, encoding: str = 'utf-8') -> Tuple[str, ...]:
+    """文件中 ${VAR} 引用的环境变量名, 文件未变化 (路径, 修改时间, 大小相同) 时不重复读取, 文件不存在时为空"""
+    file_path = os.path.abspath(file_path)
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return ()
+    return _file_env_vars(file_path, stat.st_mtime_ns, stat.st_size, encoding)
+
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def compile_template(text: str) -> Tuple[Union[str, Tuple[str, str]], ...]:
+    """把字符串编译为 (文本片段 或 (变量名, 默认值)) 组成的元组"""
+    parts, pos = [], 0
+    for m in VAR_PATTERN.finditer(text):
+        if m.start() > pos:
+            parts.append(text[pos:m.start()])
+        var, _, default = m.groups()
+        parts.append((var, default or ''))
+        pos = m.end()
+    if pos < len(text):
+        parts.append(text[pos:])
+    return tuple(parts)
+
+
+def substitute_env(text: str, env: Optional[Mapping[str, str]] = None) -> str:
+    """替换字符串中的 ${VAR} / ${VAR:-default}, 变量不存在时使用默认值 (没有默认值时为空字符串)"""
+    if '${' not in text:
+        return text
+    env = current_env() if env is None else env
+    return ''.join([part if part.__class__ is str else env.get(part[0], part[1])
+                    for part in compile_template(text)])
+
+
+def substitute_env_in(data: Any, env: Optional[Mapping[str, str]] = None) -> Any:
+    """替换 dict/list 嵌套数据中所有字符串值里的环境变量, 原地修改并返回 data"""
+    env = current_env() if env is None else env
+    if data.__class__ is str:
+        return substitute_env(data, env)
+    if data.__class__ is not dict and data.__class__ is not list:
+        return data
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        items = node.items() if node.__class__ is dict else enumerate(node)
+        for key, value in items:
+            value_class = value.__class__
+            if value_class is str:
+                if '${' in value:
+                    node[key] = substitute_env(value, env)
+            elif value_class is dict or value_class is list:
+                stack.append(value)
+    return data
@@ -1,9 +1,31 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Union, List
+from typing import Callable, Iterator, List, Optional, Tuple, Union
 
+from .utils import to_columns
 
-def get_xls_sheet_data(sheet, header=False, skip=0):
+PARALLEL_MIN_FILE_SIZE = 1024 * 1024  # 小于该大小的工作簿进程池启动耗时占主导, 串行加载
+
+
+def _use_workers(file_path: Union[Path, str], workers: Optional[int]) -> bool:
+    return bool(workers) and workers > 1 and os.path.getsize(file_path) >= PARALLEL_MIN_FILE_SIZE
+
+
+def _load_sheets_parallel(load_sheet: Callable, file_path: Union[Path, str], names: List[str], workers: int,
+                          **kwargs) -> dict:
+    """每个子进程自行打开工作簿并解析一个工作表, 结果按 names 顺序返回"""
+    with ProcessPoolExecutor(max_workers=min(workers, len(names))) as executor:
+        futures = [executor.submit(load_sheet, file_path, name, **kwargs) for name in names]
+        return {name: future.result() for name, future in zip(names, futures)}
+
+
+def get_xls_sheet_data(sheet, header=False, skip=0, columnar=False):
     assert isinstance(skip, int) and skip >= 0
+    if columnar:
+        rows = (sheet.row_values(i) for i in range(skip, sheet.nrows))
+        headers = next(rows, []) if header else None
+        return to_columns(rows, headers)
     data = [sheet.row_values(i) for i in range(skip, sheet.nrows)]
 
     if header is True and data:  # todo column name as header
@@ -12,13 +34,40 @@ def get_xls_sheet_data(sheet, header=False, skip=0):
     return data
 
 
-def load_xls(file_path: Union[Path, str], skip=0, header=False, sheets=None) -> Union[list, dict]:
+def get_xls_sheet_names(file_path: Union[Path, str], sheets) -> List[str]:
+    xlrd = __import__('xlrd')
+    wb = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        names = wb.sheet_names()
+        if isinstance(sheets, (list, tuple)):
+            return [names[i] if isinstance(i, int) else i for i in sheets]
+        return names
+    finally:
+        wb.release_resources()
+
+
+def _load_xls_sheet(file_path: Union[Path, str], name: str, header=False, skip=0, columnar=False):
+    xlrd = __import__('xlrd')
+    wb = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        return get_xls_sheet_data(wb.sheet_by_name(name), header=header, skip=skip, columnar=columnar)
+    finally:
+        wb.release_resources()
+
+
+def load_xls(file_path: Union[Path, str], skip=0, header=False, sheets=None, columnar=False,
+             workers=None) -> Union[list, dict]:
     # todo float->int ->str, FALSE -> False, '' -> None
     xlrd = __import__('xlrd')  # todo change to openpyxl
+    if sheets is not None and _use_workers(file_path, workers):
+        names = get_xls_sheet_names(file_path, sheets)
+        if len(names) > 1:
+            return _load_sheets_parallel(_load_xls_sheet, file_path, names, workers,
+                                         header=header, skip=skip, columnar=columnar)
     wb = xlrd.open_workbook(file_path)
 
     if sheets is None:
-        return get_xls_sheet_data(wb.sheet_by_index(0), header=header, skip=skip)  # list
+        return get_xls_sheet_data(wb.sheet_by_index(0), header=header, skip=skip, columnar=columnar)  # list
 
     if isinstance(sheets, (list, tuple)):
         keep_sheets = [wb.sheet_by_index(i) if isinstance(i, int) else wb.sheet_by_name(i)
@@ -28,14 +77,19 @@ def load_xls(file_path: Union[Path, str], skip=0, header=False, sheets=None) ->
 
     data = {}
     for sh in keep_sheets:
-        data[sh.name] = get_xls_sheet_data(sh, header=header, skip=skip)
+        data[sh.name] = get_xls_sheet_data(sh, header=header, skip=skip, columnar=columnar)
     return data
 
 
-def get_xlsx_sheet_data(sheet, header=False, skip=0) -> Union[List[dict], List[list]]:
+def get_xlsx_sheet_data(sheet, header=False, skip=0, columnar=False) -> Union[List[dict], List[list], dict]:
     assert isinstance(skip, int) and skip >= 0
     assert sheet.max_row > skip
 
+    if columnar:
+        rows = ([cell.value for cell in row] for row in sheet.iter_rows(min_row=1 + skip))
+        headers = next(rows, []) if header else None
+        return to_columns(rows, headers)
+
     data = []
     if header is True:
         headers, row_data = [], []
@@ -51,21 +105,89 @@ def get_xlsx_sheet_data(sheet, header=False, skip=0) -> Union[List[dict], List[l
     return data
 
 
-def load_xlsx(file_path, header=False, skip=0, sheets=None) -> Union[dict, list]:
-    openpyxl = __import__('openpyxl')
-    wb = openpyxl.load_workbook(file_path)  # 有路径应带上路径
+def get_xlsx_sheets(wb, sheets) -> list:
+    if isinstance(sheets, (list, tuple)):
+        return [wb.worksheets[i] if isinstance(i, int) else wb[i]
+                for i in sheets]  # todo try
+    return wb.worksheets
 
-    # todo 使用指定工作表
-    if sheets is None:
-        return get_xlsx_sheet_data(wb.active, header=header, skip=skip)
 
-    if isinstance(sheets, (list, tuple)):
-        keep_sheets = [wb.worksheets[i] if isinstance(i, int) else wb[i]
-                       for i in sheets]  # todo try
+def iter_xlsx_sheet_rows(sheet, header=False, skip=0) -> Iterator[Union[dict, list]]:
+    """按值逐行读取工作表 (适用于 read_only 工作簿), header=True 时跳过 skip 行后的第一行作为标题行"""
+    assert isinstance(skip, int) and skip >= 0
+    rows = sheet.iter_rows(min_row=1 + skip, values_only=True)
+    if header is True:
+        headers = next(rows, None) or ()
+        for row in rows:
+            yield dict(zip(headers, row))
     else:
-        keep_sheets = wb.sheets()
+        for row in rows:
+            yield list(row)
 
-    data = {}
-    for sh in keep_sheets:
-        data[sh.title] = get_xlsx_sheet_data(sh, header=header, skip=skip)
-    return data
+
+def get_xlsx_sheet_values(sheet, header=False, skip=0, columnar=False) -> Union[List[dict], List[list], dict]:
+    if columnar:
+        rows = iter_xlsx_sheet_rows(sheet, skip=skip)
+        headers = next(rows, []) if header else None
+        return to_columns(rows, headers)
+    return list(iter_xlsx_sheet_rows(sheet, header=header, skip=skip))
+
+
+def iter_xlsx(file_path, header=False, skip=0, sheets=None) -> Iterator[Union[dict, list, Tuple[str, Union[dict, list]]]]:
+    """以只读模式流式读取 xlsx, 未指定 sheets 时逐行返回当前工作表数据, 否则逐行返回 (工作表名, 行数据)
+
+    迭代结束或生成器关闭时会关闭工作簿
+    """
+    openpyxl = __import__('openpyxl')
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        if sheets is None:
+            yield from iter_xlsx_sheet_rows(wb.active, header=header, skip=skip)
+            return
+        for sh in get_xlsx_sheets(wb, sheets):
+            for row in iter_xlsx_sheet_rows(sh, header=header, skip=skip):
+                yield sh.title, row
+    finally:
+        wb.close()
+
+
+def get_xlsx_sheet_names(file_path, sheets) -> List[str]:
+    openpyxl = __import__('openpyxl')
+    wb = openpyxl.load_workbook(file_path, read_only=True)
+    try:
+        return [sh.title for sh in get_xlsx_sheets(wb, sheets)]
+    finally:
+        wb.close()
+
+
+def _load_xlsx_sheet(file_path, name: str, header=False, skip=0, columnar=False, read_only=False):
+    openpyxl = __import__('openpyxl')
+    wb = openpyxl.load_workbook(file_path, read_only=read_only)
+    get_sheet_data = get_xlsx_sheet_values if read_only else get_xlsx_sheet_data
+    try:
+        return get_sheet_data(wb[name], header=header, skip=skip, columnar=columnar)
+    finally:
+        wb.close()
+
+
+def load_xlsx(file_path, header=False, skip=0, sheets=None, columnar=False, read_only=False,
+              workers=None) -> Union[dict, list]:
+    openpyxl = __import__('openpyxl')
+    if sheets is not None and _use_workers(file_path, workers):
+        names = get_xlsx_sheet_names(file_path, sheets)
+        if len(names) > 1:
+            return _load_sheets_parallel(_load_xlsx_sheet, file_path, names, workers,
+                                         header=header, skip=skip, columnar=columnar, read_only=read_only)
+    wb = openpyxl.load_workbook(file_path, read_only=read_only)  # 有路径应带上路径
+    get_sheet_data = get_xlsx_sheet_values if read_only else get_xlsx_sheet_data
+
+    try:
+        if sheets is None:
+            return get_sheet_data(wb.active, header=header, skip=skip, columnar=columnar)
+
+        data = {}
+        for sh in get_xlsx_sheets(wb, sheets):
+            data[sh.title] = get_sheet_data(sh, header=header, skip=skip, columnar=columnar)
+        return data
+    finally:
+        wb.close()
@@ -1,33 +1,221 @@
+from collections import defaultdict
 from html.parser import HTMLParser
+from typing import Callable, Iterator, Optional, Union
 
-SINGLE_TAGS = ['br', 'hr', 'img', 'input', 'param', 'meta', 'link']
+SINGLE_TAGS = ['br', 'hr', 'img', 'input', 'param', 'meta', 'link', 'area', 'base', 'col', 'embed', 'source',
+               'track', 'wbr']
+SCOPE_TAGS = {'html', 'table', 'td', 'th', 'caption', 'template', 'object', 'marquee', 'applet', 'button'}
+P_CLOSING_TAGS = ['address', 'article', 'aside', 'blockquote', 'details', 'dialog', 'dd', 'div', 'dl', 'dt',
+                  'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+                  'header', 'hgroup', 'hr', 'li', 'main', 'menu', 'nav', 'ol', 'p', 'pre', 'section', 'summary',
+                  'table', 'ul']
+# {开始标签: (隐式关闭的标签, 边界标签)}
+IMPLICIT_CLOSE_RULES = {
+    **{tag: ({'p'}, SCOPE_TAGS) for tag in P_CLOSING_TAGS},
+    'li': ({'li', 'p'}, SCOPE_TAGS | {'ul', 'ol', 'menu'}),
+    'dt': ({'dt', 'dd', 'p'}, SCOPE_TAGS | {'dl'}),
+    'dd': ({'dt', 'dd', 'p'}, SCOPE_TAGS | {'dl'}),
+    'td': ({'td', 'th'}, {'tr', 'table'}),
+    'th': ({'td', 'th'}, {'tr', 'table'}),
+    'tr': ({'tr', 'td', 'th'}, {'thead', 'tbody', 'tfoot', 'table'}),
+    'thead': ({'thead', 'tbody', 'tfoot', 'tr', 'td', 'th', 'caption'}, {'table'}),
+    'tbody': ({'thead', 'tbody', 'tfoot', 'tr', 'td', 'th', 'caption'}, {'table'}),
+    'tfoot': ({'thead', 'tbody', 'tfoot', 'tr', 'td', 'th', 'caption'}, {'table'}),
+    'option': ({'option'}, {'select', 'datalist', 'optgroup'}),
+    'optgroup': ({'optgroup', 'option'}, {'select'}),
+    'body': ({'head'}, {'html'}),
+}
+HTML_CHUNK_SIZE = 64 * 1024
+
+
+def match_element(tag: str, attrs: dict, select_tag: Optional[str] = None, select_attrs: Optional[dict] = None) -> bool:
+    """按标签名及属性筛选元素, 属性值为 None 时只要求属性存在, class 属性按单个类名匹配"""
+    if select_tag is not None and tag != select_tag.lower():
+        return False
+    for key, value in (select_attrs or {}).items():
+        if key not in attrs:
+            return False
+        if value is None:
+            continue
+        if key == 'class' and value in (attrs[key] or '').split():
+            continue
+        if attrs[key] != value:
+            return False
+    return True
+
+
+class HtmlNode(object):
+    """紧凑的节点表示, 没有属性或子节点时 attrs/children 为 None, 不分配空的 dict/list"""
+    __slots__ = ('tag', 'attrs', 'children', 'text')
+
+    def __init__(self, tag: str, attrs: Optional[dict] = None, text: str = ''):
+        self.tag = tag
+        self.attrs = attrs or None
+        self.children = None
+        self.text = text
+
+    def __repr__(self):
+        return f'HtmlNode(tag={self.tag!r}, attrs={self.attrs!r}, text={self.text!r})'
+
+    def append(self, child: 'HtmlNode'):
+        if self.children is None:
+            self.children = []
+        self.children.append(child)
+
+    def to_dict(self) -> dict:
+        """转换为 dict(tag, attrs, children, text), 与 HtmlParser 默认输出一致"""
+        root = dict(tag=self.tag, attrs=dict(self.attrs or {}), children=[], text=self.text)
+        stack = [(self, root)]
+        while stack:
+            node, data = stack.pop()
+            for child in node.children or ():
+                child_data = dict(tag=child.tag, attrs=dict(child.attrs or {}), children=[], text=child.text)
+                data['children'].append(child_data)
+                if child.children:
+                    stack.append((child, child_data))
+        return root
 
 
 class HtmlParser(HTMLParser):
-    def __init__(self):
+    """解析为 dict(tag, attrs, children, text) 树, compact=True 时解析为 HtmlNode 树
+
+    - 结束标签关闭最近的同名元素及其内未关闭的元素, 没有对应开始标签的结束标签被忽略
+    - 按 HTML 规范隐式关闭 <p>, <li>, <td>, <tr>, <option> 等元素, 文档结束时关闭所有未关闭元素
+    - 元素内被子元素分隔的多段文本以空格拼接
+    - 每个事件的处理为 O(1) 均摊, 未闭合标签等异常输入下仍为线性时间
+
+    指定 callback 及 select_tag/select_attrs 时, 每个匹配元素解析完成后调用 callback(元素),
+    discard=True 时不保留不在匹配元素内的元素, 内存占用与页面大小无关
+    """
+    def __init__(self, select_tag: Optional[str] = None, select_attrs: Optional[dict] = None,
+                 callback: Optional[Callable[[Union[dict, HtmlNode]], None]] = None, discard: bool = False,
+                 compact: bool = False):
         super().__init__()
         self.stack = []
         self.data = None
+        self.compact = compact
+        self.select_tag = select_tag
+        self.select_attrs = select_attrs
+        self.callback = callback
+        self.discard = discard
+        # 以下与 stack 一一对应
+        self._tags = []
+        self._texts = []  # 每个元素的文本片段
+        self._matched = []  # 元素是否匹配
+        self._positions = defaultdict(list)  # {标签: 该标签未关闭元素在 stack 中的位置}
+        self._open_matches = 0
+        self._text = []  # 分块输入时同一段文本可能被拆分为多次 handle_data
+
+    def _new_node(self, tag, attrs) -> Union[dict, HtmlNode]:
+        if self.compact:
+            return HtmlNode(tag, dict(attrs) if attrs else None)
+        return dict(tag=tag, attrs=dict(attrs), children=[], text='')
+
+    def _match(self, tag, attrs) -> bool:
+        return self.callback is not None and match_element(tag, dict(attrs), self.select_tag, self.select_attrs)
+
+    def _append(self, node: Union[dict, HtmlNode], matched: bool):
+        if matched:
+            self.callback(node)
+        if self.discard and not self._open_matches:
+            return
+        if self.stack:
+            parent = self.stack[-1]
+            if self.compact:
+                parent.append(node)
+            else:
+                parent['children'].append(node)
+
+    def _flush_text(self):
+        if not self._text:
+            return
+        data = ''.join(self._text).strip()
+        self._text.clear()
+        if data and self._texts:
+            self._texts[-1].append(data)
+
+    def _last_position(self, tags) -> int:
+        positions = [self._positions[tag][-1] for tag in tags if self._positions[tag]]
+        return max(positions) if positions else -1
+
+    def _push(self, tag, attrs):
+        self._positions[tag].append(len(self.stack))
+        self.stack.append(self._new_node(tag, attrs))
+        self._tags.append(tag)
+        self._texts.append([])
+        matched = self._match(tag, attrs)
+        self._matched.append(matched)
+        self._open_matches += matched
+
+    def _pop(self):
+        current = self.stack.pop()
+        self._positions[self._tags.pop()].pop()
+        text = ' '.join(self._texts.pop())
+        if self.compact:
+            current.text = text
+        else:
+            current['text'] = text
+        matched = self._matched.pop()
+        self._open_matches -= matched
+        self.data = current
+        self._append(current, matched)
+
+    def _close_to(self, position: int):
+        while len(self.stack) > position:
+            self._pop()
+
+    def _close_implicit(self, tag):
+        """新元素开始时隐式关闭边界内最近的可关闭元素 (如新的 <li> 关闭上一个 <li>)"""
+        rule = IMPLICIT_CLOSE_RULES.get(tag)
+        if rule is None:
+            return
+        closes, boundaries = rule
+        boundary = self._last_position(boundaries)
+        positions = [pos for pos in (self._positions[t][-1] for t in closes if self._positions[t]) if pos > boundary]
+        if positions:
+            self._close_to(min(positions))
 
     def handle_starttag(self, tag, attrs):
+        self._flush_text()
         tag = tag.lower()
         if tag in SINGLE_TAGS:
             return self.handle_startendtag(tag, attrs)
-        self.stack.append(dict(tag=tag, attrs=dict(attrs), children=[], text=''))
+        self._close_implicit(tag)
+        self._push(tag, attrs)
 
     def handle_endtag(self, tag):
-        self.data = current = self.stack.pop()
-        if self.stack:
-            parent = self.stack[-1]
-            parent['children'].append(current)
+        self._flush_text()
+        tag = tag.lower()
+        positions = self._positions.get(tag)
+        if positions:  # 忽略没有对应开始标签的结束标签
+            self._close_to(positions[-1])
 
     def handle_startendtag(self, tag, attrs):
-        if self.stack:
-            parent = self.stack[-1]
-            parent['children'].append(dict(tag=tag, attrs=dict(attrs), children=[], text=''))
+        self._flush_text()
+        self._close_implicit(tag)
+        node = self._new_node(tag, attrs)
+        self._append(node, self._match(tag, attrs))
+
+    def handle_comment(self, data):
+        self._flush_text()
 
     def handle_data(self, data):
-        if not data.strip():
-            return
-        if self.stack:
-            self.stack[-1]['text'] = data.strip()
+        self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush_text()
+        self._close_to(0)
+
+
+def iter_html(fp, select_tag: Optional[str] = None, select_attrs: Optional[dict] = None,
+              chunk_size: int = HTML_CHUNK_SIZE, compact: bool = False) -> Iterator[Union[dict, HtmlNode]]:
+    """从文件对象分块读取 HTML, 逐个返回匹配的元素 (子树), 不保留整个文档树"""
+    found = []
+    parser = HtmlParser(select_tag, select_attrs, callback=found.append, discard=True, compact=compact)
+    for chunk in iter(lambda: fp.read(chunk_size), ''):
+        parser.feed(chunk)
+        yield from found
+        found.clear()
+    parser.close()
+    yield from found
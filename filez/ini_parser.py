@@ -1,19 +1,43 @@
 import configparser
-import os
-import re
-from typing import Any, Dict, Mapping, Optional
+from typing import Any, Dict, Iterator, Mapping, Optional
 
+from filez.env import snapshot_env, substitute_env
 from filez.utils import cast_value
 
-VAR_PATTERN = re.compile(r'\$\{([A-Z_][A-Z0-9_]*)(:-([^}]*))?\}', re.I)
+QUOTES = '"\''
 
 
-def _substitute_env(text: str) -> str:
-    def _repl(m: re.Match) -> str:
-        var, _, default = m.groups()
-        return os.environ.get(var, default if default is not None else '')
+def _find_comment(line: str, start: int = 0, end: int = -1) -> int:
+    """行内注释的位置: 空白字符后的 # 或 ; (只有一个空白字符且其前为转义符 \\ 或双引号时除外), 没有注释时返回 -1"""
+    end = len(line) if end < 0 else end
+    while start < end:
+        hash_pos, semicolon_pos = line.find('#', start, end), line.find(';', start, end)
+        pos = semicolon_pos if hash_pos < 0 or 0 <= semicolon_pos < hash_pos else hash_pos
+        if pos < 0:
+            return -1
+        if pos > 0 and line[pos - 1] in ' \t' and (pos < 2 or line[pos - 2] not in '\\"'):
+            return pos
+        start = pos + 1
+    return -1
 
-    return VAR_PATTERN.sub(_repl, text)
+
+def _strip_comment(line: str, delimiter: int = -1) -> str:
+    """去掉行内注释, delimiter 为分隔符位置, 分隔符后以引号开头的值中的 # 和 ; 不作为注释"""
+    pos = _find_comment(line, 0, delimiter)
+    if pos < 0 and delimiter >= 0:
+        start, size = delimiter + 1, len(line)
+        while start < size and line[start] in ' \t':
+            start += 1
+        if start < size and line[start] in QUOTES:
+            end_quote = line.find(line[start], start + 1)
+            if end_quote > 0:
+                start = blank = end_quote + 1
+                while blank < size and line[blank] in ' \t':
+                    blank += 1
+                if start < blank < size and line[blank] in '#;':  # 闭合引号后紧跟的注释, 不受双引号规则影响
+                    return line[:blank]
+        pos = _find_comment(line, start)
+    return line if pos < 0 else line[:pos]
 
 
 class IniParser(configparser.ConfigParser):
@@ -24,25 +48,190 @@ class IniParser(configparser.ConfigParser):
         self._parse_value = parse_value
         self._parse_env = parse_env
         self._parse_datetime = parse_datetime  # todo
+        self.env: Optional[Mapping[str, str]] = None  # 环境变量快照, 为 None 时使用当前 env_scope 的快照或 os.environ
 
     def _read(self, fp, filename):
-        lines = []
-        for raw in fp:
-            line = re.sub(r'(?<!")(?<!\\)\s+[#;].*$', '', raw).rstrip()
-            if line:
-                lines.append(line + '\n')
-        super()._read(lines, filename)
+        """单次扫描解析: 整行注释, 行内注释, 引号值, 多行续行及 = / : 分隔符, 结果与 ConfigParser 一致"""
+        delimiters, comment_prefixes = self._delimiters, self._comment_prefixes
+        elements_added = set()
+        cursect = sectname = optname = None
+        indent_level = 0
+        error = None
+        for lineno, line in enumerate(fp, start=1):
+            value = line.strip()
+            if not value or value.startswith(comment_prefixes):
+                continue
+            cur_indent_level = line.find(value[0])
+            if cursect is not None and optname and cur_indent_level > indent_level:  # 续行
+                if '#' in value or ';' in value:
+                    value = _strip_comment(line, cur_indent_level - 1).strip()  # 值从缩进后开始
+                    if not value:
+                        continue
+                if cursect[optname] is None:  # 无值选项不能有续行
+                    error = error or configparser.ParsingError(filename)
+                    error.append(lineno, repr(line))
+                    continue
+                cursect[optname].append(value)
+                continue
+
+            delimiter = -1
+            for d in delimiters:
+                pos = line.find(d)
+                if pos >= 0 and (delimiter < 0 or pos < delimiter):
+                    delimiter = pos
+            if '#' in value or ';' in value:
+                line = _strip_comment(line, delimiter)
+                value = line.strip()
+                if not value:
+                    continue
+                if delimiter >= len(line):
+                    delimiter = -1
+            indent_level = cur_indent_level
+            header_end = value.rfind(']')
+            if value[0] == '[' and header_end >= 2:  # 节
+                sectname = value[1:header_end]
+                if sectname in self._sections:
+                    if self._strict and sectname in elements_added:
+                        raise configparser.DuplicateSectionError(sectname, filename, lineno)
+                    cursect = self._sections[sectname]
+                    elements_added.add(sectname)
+                elif sectname == self.default_section:
+                    cursect = self._defaults
+                else:
+                    cursect = self._dict()
+                    self._sections[sectname] = cursect
+                    self._proxies[sectname] = configparser.SectionProxy(self, sectname)
+                    elements_added.add(sectname)
+                optname = None
+                continue
+            if cursect is None:
+                raise configparser.MissingSectionHeaderError(filename, lineno, line)
+
+            if delimiter >= 0:
+                optname, optval = line[:delimiter].strip(), [line[delimiter + 1:].strip()]
+            elif self._allow_no_value:
+                optname, optval = value, None
+            else:
+                optname = None
+            if optname is None:
+                error = error or configparser.ParsingError(filename)
+                error.append(lineno, repr(line))
+                continue
+            if not optname:  # 与 ConfigParser 一致, 记录错误后仍保存该选项
+                error = error or configparser.ParsingError(filename)
+                error.append(lineno, repr(line))
+            optname = self.optionxform(optname)
+            if self._strict and (sectname, optname) in elements_added:
+                raise configparser.DuplicateOptionError(sectname, optname, filename, lineno)
+            elements_added.add((sectname, optname))
+            cursect[optname] = optval
+        self._join_multiline_values()
+        if error:
+            raise error
 
     def get(self, section: str, option: str, *, raw: bool = False, vars: Optional[Mapping[str, str]] = None,
             fallback: Any = None) -> Any:
         value = super().get(section, option, raw=raw, vars=vars, fallback=fallback)
         if raw or value is None:
             return value
+        return self.convert_value(value)
+
+    def convert_value(self, value: str) -> Any:
+        """替换环境变量及自动转换类型"""
         if self._parse_env:
-            value = _substitute_env(value)
+            value = substitute_env(value, self.env)
         if self._parse_value:
             value = cast_value(value)
         return value
 
     def items_dict(self) -> Dict[str, Dict[str, Any]]:
         return {sect: {k: self.get(sect, k) for k in self.options(sect)} for sect in self.sections()}
+
+    def lazy_items_dict(self) -> 'LazyIniData':
+        """与 items_dict 结果相同的只读映射, 值在首次访问时才解析及转换类型"""
+        return LazyIniData(self)
+
+
+class LazyIniSection(Mapping):
+    """节的只读映射视图, 值 (插值, 环境变量替换, 类型转换) 在首次访问时解析并缓存"""
+
+    def __init__(self, parser: IniParser, section: str):
+        self._parser = parser
+        self._section = section
+        self._options = dict.fromkeys(parser.options(section))
+        self._values: Dict[str, Any] = {}
+        self._env_keys = set()  # 引用了环境变量的选项, 环境变量快照更新时需要重新解析
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if key not in self._options:
+            raise KeyError(key)
+        parser = self._parser
+        value = configparser.ConfigParser.get(parser, self._section, key)  # %(option)s 插值
+        if value is not None:
+            if parser._parse_env and '${' in value:
+                self._env_keys.add(key)
+            value = parser.convert_value(value)
+        self._values[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._options)
+
+    def __len__(self) -> int:
+        return len(self._options)
+
+    def __repr__(self):
+        return f'LazyIniSection({self._section!r}, resolved={len(self._values)}/{len(self._options)})'
+
+    def invalidate_env(self):
+        for key in self._env_keys:
+            self._values.pop(key, None)
+        self._env_keys.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self._options}
+
+
+class LazyIniData(Mapping):
+    """load_ini(..., lazy=True) 的结果, {节名: LazyIniSection}
+
+    解析时使用创建时的环境变量快照, 调用 refresh_env() 重新获取快照, 快照变化时引用了环境变量的值在下次访问时重新解析
+    """
+
+    def __init__(self, parser: IniParser):
+        self._parser = parser
+        parser.env = snapshot_env(parser.env)
+        self._sections = {section: LazyIniSection(parser, section) for section in parser.sections()}
+
+    def __getitem__(self, section: str) -> LazyIniSection:
+        return self._sections[section]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sections)
+
+    def __len__(self) -> int:
+        return len(self._sections)
+
+    def __repr__(self):
+        return f'LazyIniData({list(self._sections)!r})'
+
+    @property
+    def env(self) -> Mapping[str, str]:
+        return self._parser.env
+
+    def refresh_env(self, env: Optional[Mapping[str, str]] = None) -> bool:
+        """重新获取环境变量快照 (默认为当前 os.environ), 快照有变化时返回 True"""
+        env = snapshot_env(env)
+        if env == self._parser.env:
+            return False
+        self._parser.env = env
+        for section in self._sections.values():
+            section.invalidate_env()
+        return True
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: section.to_dict() for name, section in self._sections.items()}
@@ -0,0 +1,135 @@
+"""可选的 JSON 后端, 安装了 orjson/ujson 时使用 C 实现解析及序列化, 否则使用标准库 json
+
+各后端的 datetime 编码与 DateTimeEncoder 一致 (isoformat); 指定 object_hook (如 datetime_hook) 时使用标准库解析,
+标准库在解析过程中调用 hook, 比 C 后端解析后再遍历一次更快; 后端不支持的参数或数据 (如 NaN, 超出 64 位的整数)
+自动回退到标准库, 把超出 64 位的整数解析为 float 的 orjson 版本视为不可用
+"""
+import datetime
+import json
+import math
+from functools import lru_cache
+from typing import Any, Callable, Optional, Union
+
+from .json_encoder import DateTimeEncoder
+
+JSON_BACKENDS = ('orjson', 'ujson', 'json')  # auto 时按此顺序选择已安装的后端
+
+_encode_default = DateTimeEncoder().default
+
+
+def has_non_finite(data: Any) -> bool:
+    """数据中是否有 NaN / Infinity (orjson 会把它们保存为 null)"""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        node_class = node.__class__
+        if node_class is float:
+            if not math.isfinite(node):
+                return True
+        elif node_class is dict:
+            stack.extend(node.values())
+        elif node_class is list or node_class is tuple:
+            stack.extend(node)
+    return False
+
+
+class JsonBackend(object):
+    """标准库 json"""
+    name = 'json'
+
+    def loads(self, text: Union[str, bytes], object_hook: Optional[Callable[[dict], Any]] = None, **kwargs) -> Any:
+        return json.loads(text, object_hook=object_hook, **kwargs)
+
+    def dumps(self, data: Any, **kwargs) -> str:
+        kwargs.setdefault('cls', DateTimeEncoder)
+        return json.dumps(data, **kwargs)
+
+
+class OrjsonBackend(JsonBackend):
+    """orjson, 只支持 indent=2 及 sort_keys 参数, 输出为 UTF-8 (不转义非 ASCII 字符) 的紧凑格式"""
+    name = 'orjson'
+
+    def __init__(self):
+        self.orjson = __import__('orjson')
+        for text in ('18446744073709551616', '-9223372036854775809'):
+            try:
+                value = self.orjson.loads(text)
+            except ValueError:  # 超出 64 位时报错的版本, loads 会回退到标准库
+                continue
+            if value.__class__ is not int:  # 部分版本把超出 64 位的整数解析为 float, 会丢失精度
+                raise ImportError(f'orjson {getattr(self.orjson, "__version__", "")} '
+                                  f'parses integers wider than 64 bits as float')
+
+    def loads(self, text: Union[str, bytes], object_hook: Optional[Callable[[dict], Any]] = None, **kwargs) -> Any:
+        if kwargs or object_hook is not None:
+            return super().loads(text, object_hook=object_hook, **kwargs)
+        try:
+            return self.orjson.loads(text)
+        except ValueError:  # NaN/Infinity, 超出 64 位的整数, 嵌套过深等
+            return super().loads(text)
+
+    def dumps(self, data: Any, **kwargs) -> str:
+        indent = kwargs.pop('indent', None)
+        sort_keys = kwargs.pop('sort_keys', False)
+        if indent not in (None, 2) or kwargs.pop('ensure_ascii', False) or kwargs:
+            return super().dumps(data, indent=indent, sort_keys=sort_keys, **kwargs)
+        orjson = self.orjson
+        # datetime/date 交给 DateTimeEncoder 处理, 与标准库输出一致
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            text = orjson.dumps(data, default=_encode_default, option=option)
+        except orjson.JSONEncodeError:  # 超出 64 位的整数等
+            return super().dumps(data, indent=indent, sort_keys=sort_keys)
+        if b'null' in text and has_non_finite(data):  # orjson 把 NaN/Infinity 保存为 null
+            return super().dumps(data, indent=indent, sort_keys=sort_keys)
+        return text.decode('utf-8')
+
+
+class UjsonBackend(JsonBackend):
+    """ujson (需支持 default 参数, 即 5.x 以上版本)"""
+    name = 'ujson'
+    DUMPS_OPTIONS = {'indent', 'sort_keys', 'ensure_ascii'}
+
+    def __init__(self):
+        self.ujson = __import__('ujson')
+        try:
+            self.ujson.dumps(datetime.date.min, default=_encode_default)
+        except TypeError:  # 旧版本不支持 default, 会把 datetime 转换为时间戳
+            raise ImportError(f'ujson {getattr(self.ujson, "__version__", "")} does not support default')
+
+    def loads(self, text: Union[str, bytes], object_hook: Optional[Callable[[dict], Any]] = None, **kwargs) -> Any:
+        if kwargs or object_hook is not None:
+            return super().loads(text, object_hook=object_hook, **kwargs)
+        try:
+            return self.ujson.loads(text)
+        except ValueError:  # NaN/Infinity, 超出 64 位的整数, 嵌套过深等
+            return super().loads(text)
+
+    def dumps(self, data: Any, **kwargs) -> str:
+        if not set(kwargs) <= self.DUMPS_OPTIONS:
+            return super().dumps(data, **kwargs)
+        try:
+            return self.ujson.dumps(data, default=_encode_default, escape_forward_slashes=False, **kwargs)
+        except OverflowError:
+            return super().dumps(data, **kwargs)
+
+
+_BACKEND_CLASSES = {'json': JsonBackend, 'orjson': OrjsonBackend, 'ujson': UjsonBackend}
+
+
+@lru_cache(maxsize=None)
+def get_json_backend(name: Optional[str] = 'auto') -> JsonBackend:
+    """获取 JSON 后端, name 为 auto 或 None 时按 JSON_BACKENDS 顺序选择已安装的后端, 指定的后端未安装时报 ImportError"""
+    if name in ('auto', None):
+        for backend_name in JSON_BACKENDS:
+            try:
+                return get_json_backend(backend_name)
+            except ImportError:
+                continue
+    if name not in _BACKEND_CLASSES:
+        raise ValueError(f'不支持的 JSON 后端: {name!r}, 可选: auto, {", ".join(JSON_BACKENDS)}')
+    return _BACKEND_CLASSES[name]()
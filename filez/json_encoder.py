@@ -1,13 +1,14 @@
 import json
 import datetime
 import re
-from typing import Any, Union
+from typing import Any, Callable, Iterable, List, Union
 
 ISO_DATETIME_PATTERN = re.compile(
     r'^\d{4}-\d{2}-\d{2}'          # 日期 2025-06-01
     r'[T ]'                        # 分隔符 T 或空格
     r'\d{2}:\d{2}:\d{2}'           # 时分秒 12:30:45
     r'(?:\.\d{1,6})?'              # 可选毫秒 .534
+    r'(?:[Zz]|[+-]\d{2}:?\d{2})?' # 可选时区 Z / +08:00
     r'$'
 )
 
@@ -30,25 +31,83 @@ class DateTimeEncoder(json.JSONEncoder):
         return super().default(obj)
 
 # ========== 自定义解码器 ==========
+def parse_iso_datetime(value: str) -> Union[datetime.datetime, datetime.date, None]:
+    """把 ISO-8601 字符串转换为 datetime/date, 不是日期时间字符串时返回 None
+
+    先用长度及固定位置字符快速排除, 只有候选字符串才进行正则匹配; 支持 Z 及 +08:00 时区
+    """
+    size = len(value)
+    if size < 10 or size > 32 or value[4] != '-' or value[7] != '-' or not value[:4].isdigit():
+        return None
+    if size == 10:
+        if ISO_DATE_PATTERN.fullmatch(value):
+            try:
+                return datetime.date.fromisoformat(value)
+            except ValueError:
+                return None
+        return None
+    if value[10] not in 'T ' or not ISO_DATETIME_PATTERN.fullmatch(value):
+        return None
+    if value[-1] in 'Zz':
+        value = value[:-1] + '+00:00'
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
 def datetime_hook(dct: dict) -> dict:
     """把 ISO-8601 字符串还原成 datetime/date"""
     for k, v in dct.items():
-        if isinstance(v, str):
-            # datetime
-            if ISO_DATETIME_PATTERN.fullmatch(v):
-                try:
-                    dct[k] = datetime.datetime.fromisoformat(v)
-                    continue
-                except ValueError:
-                    pass
-            # date
-            if ISO_DATE_PATTERN.fullmatch(v):
-                try:
-                    dct[k] = datetime.date.fromisoformat(v)
-                    continue
-                except ValueError:
-                    pass
+        if v.__class__ is str:
+            dt = parse_iso_datetime(v)
+            if dt is not None:
+                dct[k] = dt
             # 时间戳 float → datetime（可选）
             # if isinstance(v, float):
             #     dct[k] = datetime.datetime.fromtimestamp(v)
     return dct
+
+
+def make_datetime_hook(keys: Iterable[str]) -> Callable[[dict], dict]:
+    """只转换指定 key 的 datetime_hook"""
+    keys = frozenset(keys)
+
+    def hook(dct: dict) -> dict:
+        for k, v in dct.items():
+            if k in keys and v.__class__ is str:
+                dt = parse_iso_datetime(v)
+                if dt is not None:
+                    dct[k] = dt
+        return dct
+
+    return hook
+
+
+def convert_datetime_paths(data: Any, paths: Iterable[str]) -> Any:
+    """按路径转换日期时间字符串, 路径以 . 分隔, * 匹配任意 key 或列表中的所有元素, 如 log.entries.*.startedDateTime"""
+    def convert(node, parts):
+        key, rest = parts[0], parts[1:]
+        if isinstance(node, dict):
+            keys = list(node) if key == '*' else [key] if key in node else []
+        elif isinstance(node, list):
+            keys = range(len(node)) if key == '*' else [int(key)] if key.isdigit() and int(key) < len(node) else []
+        else:
+            return
+        for k in keys:
+            if rest:
+                convert(node[k], rest)
+            elif node[k].__class__ is str:
+                dt = parse_iso_datetime(node[k])
+                if dt is not None:
+                    node[k] = dt
+
+    for path in paths:
+        convert(data, path.split('.'))
+    return data
+
+
+def decode_json_lines(lines: List[str], parse_datetime=False) -> list:
+    """解析多行 JSON Lines 文本, 供进程池批量解码"""
+    object_hook = datetime_hook if parse_datetime else None
+    return [json.loads(line, object_hook=object_hook) for line in lines]
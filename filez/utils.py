@@ -1,34 +1,174 @@
+import json
 import re
-from collections import OrderedDict
-from typing import Any
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
 
 import yaml
 
-VAR_PATTERN = re.compile(r'\$\{([A-Z_][A-Z0-9_]*)(:-([^}]*))?\}', re.I)
+from .env import VAR_PATTERN  # 兼容旧的导入路径
+
 BOOL_MAP = {'true': True, 'false': False, 'yes': True, 'no': False, 'on': True, 'off': False,
             '~': None, 'null': None, 'none': None}
 
+CAST_CACHE_SIZE = 4096
+NUMBER_PATTERN = re.compile(r'-?\d+(\.\d+)?')
+LIST_SEP_PATTERN = re.compile(r'\s*,\s*')
 
-def cast_value(value: str) -> Any:
-    value = value.strip()
-    if value.startswith("'") and value.endswith("'") or value.startswith('"') and value.endswith('"'):
-        return value.strip("'").strip('"')
-    if value.lower() in BOOL_MAP:
-        return BOOL_MAP[value.lower()]
-    if re.fullmatch(r'-?\d+', value):
-        return int(value)
-    if re.fullmatch(r'-?\d+\.\d+', value):
-        return float(value)
-    if (value.startswith('{') and value.endswith('}')) or (value.startswith('[') and value.endswith(']')):
+_CONTAINER = object()  # dict/list 结果为可变对象, 不进入缓存
+
+
+def _json_parse_float(text: str) -> float:
+    if 'e' in text or 'E' in text:  # yaml 对 1e5 等科学计数法解析结果不同, 交由 yaml 处理
+        raise ValueError(text)
+    return float(text)
+
+
+def _json_parse_constant(text: str):
+    raise ValueError(text)  # NaN/Infinity 交由 yaml 处理
+
+
+def _load_container(value: str) -> Any:
+    try:
+        return json.loads(value, parse_float=_json_parse_float, parse_constant=_json_parse_constant)
+    except ValueError:
         return yaml.safe_load(value)
 
-    if ',' in value:
-        return [cast_value(v) for v in re.split(r'\s*,\s*', value)]
+
+@lru_cache(maxsize=CAST_CACHE_SIZE)
+def _cast_scalar(value: str) -> Any:
+    if not value:
+        return value
+    first, last = value[0], value[-1]
+    if first == last and first in '\'"':
+        return value.strip("'").strip('"')
+    lower = value.lower()
+    if lower in BOOL_MAP:
+        return BOOL_MAP[lower]
+    m = NUMBER_PATTERN.fullmatch(value)
+    if m:
+        return float(value) if m.group(1) else int(value)
+    if (first == '{' and last == '}') or (first == '[' and last == ']') or ',' in value:
+        return _CONTAINER
     return value
 
 
+def cast_value(value: str) -> Any:
+    value = value.strip()
+    result = _cast_scalar(value)
+    if result is not _CONTAINER:
+        return result
+    first, last = value[0], value[-1]
+    if (first == '{' and last == '}') or (first == '[' and last == ']'):
+        return _load_container(value)
+    return [cast_value(v) for v in LIST_SEP_PATTERN.split(value)]
+
+
 def cast_dict_value(data, ordered_dict=False):
     data = {key: cast_value(value) for key, value in data.items()}
     if ordered_dict is True:
         data = OrderedDict(data)
     return data
+
+
+def _import_numpy():
+    try:
+        return __import__('numpy')
+    except ImportError:
+        return None
+
+
+def _append_column_value(column: Union[array, list], value: Any) -> Union[array, list]:
+    """追加单元格值, 出现浮点数时 int 数组升级为 float 数组, 出现非数值时降级为 list"""
+    if type(column) is list:
+        column.append(value)
+        return column
+    value_type = type(value)
+    if value_type is int:
+        try:
+            column.append(value)
+            return column
+        except OverflowError:
+            pass
+    elif value_type is float:
+        if column.typecode == 'q':
+            column = array('d', column)
+        column.append(value)
+        return column
+    column = list(column)
+    column.append(value)
+    return column
+
+
+def to_columns(rows: Iterable[Union[list, dict]], headers: Optional[list] = None) -> Dict[Any, Union[array, list]]:
+    """把行数据转换为按列存储的 {列名: 列数据}, 纯数值列使用 array.array, 安装了 NumPy 时转为 ndarray
+
+    未指定 headers 时, 字典行使用第一行的 key 作为列名, 列表行使用列序号
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return {key: [] for key in headers or []}
+    rows = chain([first], rows)
+    if isinstance(first, dict):
+        headers = list(first) if headers is None else headers
+        rows = ([row.get(key) for key in headers] for row in rows)
+
+    columns: List[Union[array, list]] = [array('q') for _ in headers] if headers is not None else []
+    for row in rows:
+        if len(row) > len(columns):  # 不规则行, 之前的行缺失的单元格补 None
+            count = len(columns[0]) if columns else 0
+            columns.extend([None] * count if count else array('q') for _ in range(len(row) - len(columns)))
+        for i, value in enumerate(row):
+            columns[i] = _append_column_value(columns[i], value)
+        for i in range(len(row), len(columns)):
+            columns[i] = _append_column_value(columns[i], None)
+
+    np = _import_numpy()
+    if np is not None:
+        columns = [np.frombuffer(column, dtype=column.typecode) if isinstance(column, array) and column else column
+                   for column in columns]
+    keys = headers if headers is not None else range(len(columns))
+    return dict(zip(keys, columns))
+
+
+def diff_data(old: Any, new: Any) -> Dict[str, dict]:
+    """比较两次解析结果, 返回 {'added': {路径: 新值}, 'removed': {路径: 旧值}, 'changed': {路径: (旧值, 新值)}}
+
+    路径为 dict key 及 list 序号组成的元组, 根节点为 (); dict 及 list 逐层比较, 其他值类型或值不同时记为 changed
+    """
+    added, removed, changed = {}, {}, {}
+    stack = [((), old, new)]
+    while stack:
+        path, a, b = stack.pop()
+        if isinstance(a, dict) and isinstance(b, dict):
+            for key, value in a.items():
+                if key in b:
+                    stack.append((path + (key,), value, b[key]))
+                else:
+                    removed[path + (key,)] = value
+            for key, value in b.items():
+                if key not in a:
+                    added[path + (key,)] = value
+        elif isinstance(a, list) and isinstance(b, list):
+            stack.extend((path + (i,), a[i], b[i]) for i in range(min(len(a), len(b))))
+            removed.update((path + (i,), a[i]) for i in range(len(b), len(a)))
+            added.update((path + (i,), b[i]) for i in range(len(a), len(b)))
+        elif type(a) is not type(b) or a != b:
+            changed[path] = (a, b)
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def map_in_process_pool(func: Callable, items: Iterable, workers: int) -> Iterator:
+    """在进程池中执行 func(item), 按输入顺序返回结果; 最多 2*workers 个任务同时提交, 不会一次读入全部输入"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,276 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Union
+
+from .cache import file_signature
+from .utils import diff_data
+
+WATCH_DEBOUNCE = 0.1  # 文件最后一次变化后等待的秒数, 合并连续写入
+WATCH_INTERVAL = 1.0  # 轮询模式下检查文件状态的间隔秒数
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class PollingMonitor(object):
+    """定时检查文件的修改时间及大小"""
+
+    def __init__(self, interval: float = WATCH_INTERVAL):
+        self.interval = interval
+        self._signatures: Dict[str, tuple] = {}
+        self._wakeup = threading.Event()
+
+    def add(self, path: str):
+        if path not in self._signatures:
+            self._signatures[path] = file_signature(path)
+
+    def wait(self, timeout: float) -> Set[str]:
+        """等待最多 timeout 秒, 返回变化的文件"""
+        self._wakeup.wait(min(timeout, self.interval))
+        changed = set()
+        for path, signature in list(self._signatures.items()):
+            current = file_signature(path)
+            if current != signature:
+                self._signatures[path] = current
+                changed.add(path)
+        return changed
+
+    def wakeup(self):
+        self._wakeup.set()
+
+    def close(self):
+        pass
+
+
+class InotifyMonitor(object):
+    """使用 Linux inotify 监听文件所在目录, 编辑器先写临时文件再重命名的保存方式也能检测到"""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        self._dirs: Dict[int, str] = {}  # {watch descriptor: 目录}
+        self._paths: Set[str] = set()
+        self._lock = threading.Lock()  # 关闭后不再读写文件描述符 (编号可能已被其他文件复用)
+        self.closed = False
+
+    def add(self, path: str):
+        if path in self._paths:
+            return
+        directory = os.path.dirname(path)
+        if directory not in self._dirs.values():
+            wd = self._add_watch(self._fd, os.fsencode(directory), IN_WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()), directory)
+            self._dirs[wd] = directory
+        self._paths.add(path)
+
+    def wait(self, timeout: float) -> Set[str]:
+        readable, _, _ = select.select([self._fd, self._wakeup_r], [], [], timeout)
+        if self._fd not in readable:
+            return set()
+        changed = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, size = INOTIFY_EVENT.unpack_from(buffer, offset)
+                name = buffer[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + size].rstrip(b'\0')
+                offset += INOTIFY_EVENT.size + size
+                if mask & IN_Q_OVERFLOW:  # 事件队列溢出, 视为所有文件都有变化
+                    changed.update(self._paths)
+                    continue
+                path = os.path.join(self._dirs.get(wd, ''), os.fsdecode(name))
+                if path in self._paths:
+                    changed.add(path)
+        return changed
+
+    def wakeup(self):
+        with self._lock:
+            if not self.closed:
+                os.write(self._wakeup_w, b'\0')
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            for fd in (self._fd, self._wakeup_r, self._wakeup_w):
+                os.close(fd)
+
+
+class Watcher(object):
+    """在后台线程中监听文件变化, 只重新解析变化的文件及通过 !file 引用了它的 YAML 文件
+
+    每个文件最后一次变化 debounce 秒后才重新解析, 然后调用 callback(文件路径, 新数据, diff_data(旧数据, 新数据)),
+    解析失败时调用 error_callback(文件路径, 异常) 并保留旧数据; callback 在监听线程中执行
+    """
+
+    def __init__(self, file: "Filez", paths: Iterable[Union[Path, str]], callback: Callable[[str, Any, dict], None],
+                 debounce: float = WATCH_DEBOUNCE, interval: float = WATCH_INTERVAL, use_inotify: bool = True,
+                 error_callback: Optional[Callable[[str, Exception], None]] = None, **kwargs):
+        self.file = file
+        self.paths = [os.path.realpath(path) for path in paths]  # 与 !file 引用的路径一致, 解析符号链接
+        self.callback = callback
+        self.error_callback = error_callback
+        self.debounce = debounce
+        self.kwargs = kwargs  # 传给 file.load 的参数
+        self.data: Dict[str, Any] = {}
+        self._included_by: Dict[str, Set[str]] = {}  # {文件: 直接引用了它的 YAML 文件}
+        self._includes: Dict[str, Set[str]] = {}  # {YAML 文件: 直接引用的文件}
+        self.interval = interval
+        self._use_inotify = use_inotify
+        self.monitor = self._create_monitor()
+        self._watched: Set[str] = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _create_monitor(self):
+        if self._use_inotify:
+            try:
+                return InotifyMonitor()
+            except (OSError, AttributeError):  # 非 Linux 或 libc 不支持 inotify
+                pass
+        return PollingMonitor(self.interval)
+
+    @property
+    def use_inotify(self) -> bool:
+        return isinstance(self.monitor, InotifyMonitor)
+
+    def _watch(self, path: str):
+        try:
+            self.monitor.add(path)
+        except OSError:  # 目录不存在或超出 inotify 监听数量限制, 改为轮询
+            if isinstance(self.monitor, PollingMonitor):
+                raise
+            self.monitor.close()
+            self.monitor = PollingMonitor(self.interval)
+            for watched in self._watched:
+                self.monitor.add(watched)
+            self.monitor.add(path)
+        self._watched.add(path)
+
+    def _is_yaml(self, path: str) -> bool:
+        return self.file.file_types.get(os.path.splitext(path)[1]) == 'yaml'
+
+    def _update_includes(self, path: str):
+        """更新 YAML 文件的引用关系, 被引用的文件也加入监听"""
+        from .yaml_loader import get_yaml_includes
+        old = self._includes.get(path, set())
+        try:
+            new = {str(include) for include in get_yaml_includes(path, self.kwargs.get('encoding', 'utf-8'))}
+        except Exception:  # 文件无法解析时保留原有引用关系
+            return
+        self._includes[path] = new
+        for include in old - new:
+            self._included_by.get(include, set()).discard(path)
+        for include in new - old:
+            self._included_by.setdefault(include, set()).add(path)
+            self._watch(include)
+            if self._is_yaml(include) and include not in self._includes:
+                self._update_includes(include)
+
+    def _affected(self, changed: Iterable[str]) -> list:
+        """变化的文件及直接或间接引用了它们的文件中被监听的文件, 按 paths 顺序返回"""
+        affected, stack = set(), list(changed)
+        while stack:
+            path = stack.pop()
+            if path in affected:
+                continue
+            affected.add(path)
+            stack.extend(self._included_by.get(path, ()))
+        return [path for path in self.paths if path in affected]
+
+    def _load(self, path: str) -> Any:
+        return self.file.load(path, cache=False, **self.kwargs)
+
+    def start(self) -> 'Watcher':
+        """加载所有文件并启动监听线程, 已启动时直接返回, 已停止时使用新的监听器重新开始监听"""
+        if self._thread is not None:
+            if self._thread.is_alive():
+                return self
+            self.monitor = self._create_monitor()  # 原监听器已在监听线程退出时关闭
+            self._watched.clear()
+            self._includes.clear()
+            self._included_by.clear()
+        self._stop.clear()
+        for path in self.paths:
+            self._watch(path)
+            if self._is_yaml(path):
+                self._update_includes(path)
+            self.data[path] = self._load(path)
+        self._thread = threading.Thread(target=self._run, name='filez-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self.monitor.wakeup()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _run(self):
+        pending: Dict[str, float] = {}  # {文件: 最后一次变化的时间}
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                timeout = min(self.debounce - (now - t) for t in pending.values()) if pending else 1.0
+                changed = self.monitor.wait(max(timeout, 0))
+                now = time.monotonic()
+                for path in changed:
+                    pending[path] = now
+                ready = [path for path, t in pending.items() if now - t >= self.debounce]
+                if ready and not self._stop.is_set():
+                    for path in ready:
+                        del pending[path]
+                    self._reload(ready)
+        finally:
+            self.monitor.close()
+
+    def _reload(self, changed: list):
+        for path in changed:
+            if path in self._includes and os.path.exists(path):
+                self._update_includes(path)
+        for path in self._affected(changed):
+            if not os.path.exists(path):  # 文件被删除 (或正在被替换), 等待重新创建
+                continue
+            try:
+                data = self._load(path)
+            except Exception as e:
+                if self.error_callback is not None:
+                    self.error_callback(path, e)
+                continue
+            old, self.data[path] = self.data.get(path), data
+            diff = diff_data(old, data)
+            if any(diff.values()):
+                self.callback(path, data, diff)
@@ -1,3 +1,54 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Iterator, List, Optional, Tuple, Union
+from xml.etree import ElementTree
+
+XML_CHUNK_SIZE = 64 * 1024
+XML_ENCODING_PATTERN = re.compile(rb'^(?:\xef\xbb\xbf)?\s*<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+
+@lru_cache(maxsize=None)
+def expat_supports(encoding: str) -> bool:
+    """expat 不支持 GBK, Shift_JIS 等多字节编码"""
+    parser = ElementTree.XMLParser(encoding=encoding)
+    try:
+        parser.feed(b'<a/>')
+        parser.close()
+    except ValueError:
+        return False
+    except Exception:
+        pass
+    return True
+
+
+def open_xml(file_path: Union[Path, str], encoding: Optional[str] = None) -> Tuple[IO, Optional[ElementTree.XMLParser]]:
+    """打开 XML 文件, 返回 (文件对象, 解析器)
+
+    默认以二进制方式读取, 由 expat 按 XML 声明处理编码; 指定 encoding 时覆盖声明;
+    expat 不支持的多字节编码以文本方式读取, 由 Python 解码
+    """
+    xml_encoding = encoding
+    if xml_encoding is None:
+        with open(file_path, 'rb') as f:
+            m = XML_ENCODING_PATTERN.match(f.read(256))
+        xml_encoding = m.group(1).decode('ascii') if m else None
+    if xml_encoding and not expat_supports(xml_encoding):
+        return open(file_path, encoding=xml_encoding), None
+    return open(file_path, 'rb'), ElementTree.XMLParser(encoding=encoding) if encoding else None
+
+
+def parse_xml_file(file_path: Union[Path, str], encoding: Optional[str] = None) -> ElementTree.Element:
+    """分块读取并解析 XML 文件, 返回根节点"""
+    source, parser = open_xml(file_path, encoding)
+    parser = parser or ElementTree.XMLParser()
+    with source:
+        empty = source.read(0)  # b'' 或 ''
+        for chunk in iter(lambda: source.read(XML_CHUNK_SIZE), empty):
+            parser.feed(chunk)
+    return parser.close()
+
+
 def get_xml_children(node):
     children = list(node)
     if children:
@@ -14,29 +65,45 @@ def get_xml_children(node):
 
 def parse_xml_node(node, ignore_attrs=False, attr_key_prefix=':', child_tag_key_prefix='', default_text_key='text',
                    empty_text=None):
-    children = list(node)
-    key = child_tag_key_prefix + node.tag
-    text = node.text or empty_text
-    node_data_value = {attr_key_prefix + k: v for k, v in node.attrib.items()} if not ignore_attrs and node.attrib else {}
+    """把节点转换为 dict, 使用显式栈代替递归, 重复出现的子节点标签合并为一个列表"""
+    def convert_leaf(elem):
+        text = elem.text or empty_text
+        if ignore_attrs or not elem.attrib:
+            return {child_tag_key_prefix + elem.tag: text}
+        return {**{attr_key_prefix + k: v for k, v in elem.attrib.items()}, default_text_key: text}
 
-    if not children:
-        if ignore_attrs or not node.attrib:
-            return {key: text}
-        return {**node_data_value, default_text_key: text}
+    def new_frame(elem):
+        value = {attr_key_prefix + k: v for k, v in elem.attrib.items()} if not ignore_attrs and elem.attrib else {}
+        return elem, iter(elem), value, set()  # 节点, 子节点迭代器, 节点数据, 已转为列表的重复 key
+
+    if not len(node):
+        return convert_leaf(node)
+
+    stack = [new_frame(node)]
+    while True:
+        elem, children, value, repeated = stack[-1]
+        child = next(children, None)
+        if child is not None:
+            if len(child):
+                stack.append(new_frame(child))
+                continue
+            child_data = convert_leaf(child)
+        else:
+            stack.pop()
+            child, child_data = elem, {child_tag_key_prefix + elem.tag: value}
+            if not stack:
+                return child_data
+            elem, children, value, repeated = stack[-1]
 
-    for child in children:
-        child_data = parse_xml_node(child, ignore_attrs=ignore_attrs, attr_key_prefix=attr_key_prefix,
-                                    child_tag_key_prefix=child_tag_key_prefix, default_text_key=default_text_key,
-                                    empty_text=empty_text)  # {key: {} } or {key: xxx}
         child_key = child_tag_key_prefix + child.tag
-        child_value = child_data[child_key] if child_key in child_data.keys() else child_data
-        if child_key in node_data_value.keys():
-            child_value = child_data[child_key]
-            node_data_value[child_key] = [node_data_value[child_key]]  # orgin
-            node_data_value[child_key].append(child_value)
+        child_value = child_data[child_key] if child_key in child_data else child_data  # {key: {} } or {key: xxx}
+        if child_key in repeated:
+            value[child_key].append(child_value)
+        elif child_key in value:
+            value[child_key] = [value[child_key], child_value]
+            repeated.add(child_key)
         else:
-            node_data_value[child_key] = child_value
-    return {key: node_data_value}
+            value[child_key] = child_value
 
 
 def parse_xml_node_ignore_attrs(node, empty_text=None):
@@ -59,3 +126,49 @@ def parse_xml_node_ignore_attrs(node, empty_text=None):
         else:
             node_data_value[child_key] = child_value
     return {key: node_data_value}
+
+
+def _match_tag_path(path: List[str], tag_path: List[str], absolute: bool) -> bool:
+    if len(path) < len(tag_path) or (absolute and len(path) != len(tag_path)):
+        return False
+    return all(expected in ('*', tag) for expected, tag in zip(tag_path, path[-len(tag_path):]))
+
+
+def iter_xml(file_path: Union[Path, str], tag: str, encoding: Optional[str] = None,
+             **kwargs) -> Iterator[Union[dict, str, None]]:
+    """使用 iterparse 流式解析 XML, 逐个返回与 tag 路径匹配的节点转换后的数据, 已处理的节点随即释放
+
+    tag 支持 record / items/record / /root/items/record (从根节点匹配) 及通配符 *
+    encoding 默认由 XML 声明决定, kwargs 同 parse_xml_node
+    """
+    source, parser = open_xml(file_path, encoding)
+    with source:
+        yield from _iter_xml_nodes(source, parser, tag, **kwargs)
+
+
+def _iter_xml_nodes(source: IO, parser: Optional[ElementTree.XMLParser], tag: str,
+                    **kwargs) -> Iterator[Union[dict, str, None]]:
+    absolute = tag.startswith('/')
+    tag_path = tag.strip('/').split('/')
+    path, elems = [], []
+    matched_depth = 0  # 正在匹配中的祖先节点数, 其子树需保留到匹配节点结束
+
+    for event, elem in ElementTree.iterparse(source, events=('start', 'end'), parser=parser):
+        if event == 'start':
+            path.append(elem.tag)
+            elems.append(elem)
+            if _match_tag_path(path, tag_path, absolute):
+                matched_depth += 1
+            continue
+
+        matched = _match_tag_path(path, tag_path, absolute)
+        if matched:
+            matched_depth -= 1
+            data = parse_xml_node(elem, **kwargs)
+            key = kwargs.get('child_tag_key_prefix', '') + elem.tag
+            yield data[key] if key in data else data
+        path.pop()
+        elems.pop()
+        if matched_depth == 0 and elems:  # 不在匹配节点内, 从父节点中移除释放内存
+            elem.clear()
+            elems[-1].remove(elem)
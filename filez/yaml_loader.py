@@ -1,11 +1,19 @@
+import copy
 import datetime
 import os
+import pickle
 import re
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
+from typing import Any, Iterator, List, Optional, Tuple, Union
 
 import yaml
 
-VAR_PATTERN = re.compile(r"""\$\{([A-Z_][A-Z0-9_]*)(:-([^}]*))?\}""", re.IGNORECASE | re.VERBOSE)
+from .env import current_env, env_scope, substitute_env
 
 # ----------- 正则：ISO-8601 或 时间戳 -----------
 ISO_DT_RE = re.compile(r'(?<!\d)(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?)(?!\d)')
@@ -14,12 +22,25 @@ SEC_TS_RE = re.compile(r'(?<!\d)(1[3-9]\d{8})(?!\d)')  # 秒级
 MS_TS_RE = re.compile(r'(?<!\d)(1[6-9]\d{11})(?!\d)')  # 毫秒级
 
 
+LIBYAML_AVAILABLE = getattr(yaml, '__with_libyaml__', False)
+
+
 class YamlLoader(yaml.SafeLoader):
     def __init__(self, stream):
         super().__init__(stream)
         self.yaml_path = Path(self.name).resolve()
 
 
+if LIBYAML_AVAILABLE:
+    class CYamlLoader(yaml.CSafeLoader):
+        """基于 libyaml 的 C 加速版本, 支持的标签及环境变量替换与 YamlLoader 一致"""
+        def __init__(self, stream):
+            super().__init__(stream)
+            self.yaml_path = Path(getattr(stream, 'name', '<file>')).resolve()
+else:
+    CYamlLoader = None
+
+
 # def env_constructor(loader, node):
 #     return os.getenv(loader.construct_scalar(node), '')
 
@@ -32,17 +53,9 @@ def merge_constructor(loader, node):
     return result
 
 
-def _replace_vars(text: str) -> str:
-    def _repl(match: re.Match) -> str:
-        var_name, _, default = match.groups()
-        return os.environ.get(var_name, default or "")
-
-    return VAR_PATTERN.sub(_repl, text)
-
-
 def env_var_constructor(loader: yaml.SafeLoader, node: yaml.ScalarNode) -> str:
     value = loader.construct_scalar(node)
-    return _replace_vars(value)
+    return substitute_env(value)
 
 
 # ----------- 构造器 -----------
@@ -82,19 +95,180 @@ def date_constructor(loader: yaml.SafeLoader, node: yaml.ScalarNode) -> datetime
     return _parse_date(loader.construct_scalar(node))
 
 
-def get_yaml_loader(file: "Filez", parse_env=True, parse_datetime=True, **kwargs):
+class YamlIncludeError(yaml.YAMLError):
+    pass
+
+
+class IncludeState(object):
+    """一次顶层加载中 !file 引用的解析结果 (各线程共享) 及当前线程的引用链"""
+    def __init__(self, results: Optional[dict] = None, stack: Optional[List[Path]] = None):
+        self.results = {} if results is None else results
+        self.stack = [] if stack is None else stack
+
+
+_include_local = threading.local()
+
+
+@contextmanager
+def include_scope(yaml_path: Union[Path, str]):
+    """进入一个 YAML 文件的解析, 最外层调用时创建新的 IncludeState, 引用链中重复出现时报循环引用"""
+    current = getattr(_include_local, 'state', None)
+    top = current is None
+    state = IncludeState() if top else current
+    yaml_path = Path(yaml_path).resolve()
+    if yaml_path in state.stack:
+        chain = ' -> '.join(str(path) for path in [*state.stack[state.stack.index(yaml_path):], yaml_path])
+        raise YamlIncludeError(f'!file 循环引用: {chain}')
+    _include_local.state = state
+    state.stack.append(yaml_path)
+    try:
+        yield state
+    finally:
+        state.stack.pop()
+        if top:
+            del _include_local.state
+
+
+def _copy_data(data: Any) -> Any:
+    try:
+        return pickle.loads(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):  # 无法序列化时深拷贝
+        return copy.deepcopy(data)
+
+
+def _load_include(file: "Filez", abs_path: Path, options: dict):
+    """同一次顶层加载中, 相同文件及参数的 !file 引用只解析一次, 之后的引用返回副本, 互不影响"""
+    state = getattr(_include_local, 'state', None)
+    if state is None:
+        return file.load(abs_path, **options)
+    key = (str(abs_path), tuple(sorted((k, repr(v)) for k, v in options.items())))
+    if key not in state.results:
+        state.results[key] = data = file.load(abs_path, **options)
+        return data
+    return _copy_data(state.results[key])
+
+
+def _iter_include_paths(loader, node) -> Iterator[Path]:
+    seen, stack = set(), [node]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, yaml.ScalarNode):
+            if node.tag == '!file':
+                yield (loader.yaml_path.parent / node.value).resolve()
+        elif isinstance(node, yaml.SequenceNode):
+            stack.extend(node.value)
+        elif isinstance(node, yaml.MappingNode):
+            for key_node, value_node in node.value:
+                stack.extend((key_node, value_node))
+
+
+def get_yaml_includes(file_path: Union[Path, str], encoding: str = 'utf-8') -> List[Path]:
+    """YAML 文件中 !file 直接引用的文件 (绝对路径), 只解析节点不构造数据; 文件中没有 !file 时不解析"""
+    with open(file_path, encoding=encoding) as f:
+        if '!file' not in f.read():
+            return []
+        f.seek(0)
+        loader = (CYamlLoader if LIBYAML_AVAILABLE else YamlLoader)(f)
+        try:
+            node = loader.get_single_node()
+            return list(dict.fromkeys(_iter_include_paths(loader, node))) if node is not None else []
+        finally:
+            loader.dispose()
+
+
+@lru_cache(maxsize=1024)
+def _cached_yaml_includes(file_path: str, mtime_ns: int, size: int, encoding: str) -> Tuple[str, ...]:
+    return tuple(str(path) for path in get_yaml_includes(file_path, encoding))
+
+
+def get_yaml_includes_cached(file_path: Union[Path, str], encoding: str = 'utf-8') -> Tuple[str, ...]:
+    """同 get_yaml_includes, 文件未变化 (路径, 修改时间, 大小相同) 时不重复解析"""
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    return _cached_yaml_includes(file_path, stat.st_mtime_ns, stat.st_size, encoding)
+
+
+def _prefetch_includes(loader, node, workers: int):
+    """使用线程池并发加载文档中的 !file 引用, 结果存入当前 IncludeState"""
+    state, env = _include_local.state, current_env()
+    paths = list(dict.fromkeys(_iter_include_paths(loader, node)))
+    if len(paths) < 2:
+        return
+
+    def load(path):
+        _include_local.state = IncludeState(state.results, list(state.stack))  # 共享结果, 引用链各线程独立
+        try:
+            with env_scope(env):  # 与主线程使用同一个环境变量快照
+                return loader.load_include(path)
+        finally:
+            del _include_local.state
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+        list(executor.map(load, paths))
+
+
+def load_yaml(stream, loader_class, workers: Optional[int] = None) -> Any:
+    """解析 YAML, workers>1 时先并发加载所有 !file 引用再构造文档"""
+    with include_scope(getattr(stream, 'name', '<file>')):
+        loader = loader_class(stream)
+        try:
+            if not workers or workers <= 1:
+                return loader.get_single_data()
+            node = loader.get_single_node()
+            if node is None:
+                return None
+            _prefetch_includes(loader, node, workers)
+            return loader.construct_document(node)
+        finally:
+            loader.dispose()
+
+
+_LOADER_CACHE = weakref.WeakKeyDictionary()  # {Filez 实例: {(parse_env, parse_datetime, use_libyaml, kwargs): Loader 子类}}
+_LOADER_LOCK = threading.Lock()
+
+
+def _build_yaml_loader(file_ref: "weakref.ref", parse_env=True, parse_datetime=True, use_libyaml=True, **kwargs):
+    options = dict(parse_env=parse_env, parse_datetime=parse_datetime, **kwargs)
+    json_options = dict(options, parse_env=False)  # 引用的 JSON 与直接加载一样默认不替换环境变量
+
+    def load_include(abs_path: Path):
+        file = file_ref()
+        is_json = file.file_types.get(abs_path.suffix) == 'json'
+        return _load_include(file, abs_path, json_options if is_json else options)
+
     def file_constructor(loader: YamlLoader, node):
         rel_path = Path(loader.construct_scalar(node))
         abs_path = (loader.yaml_path.parent / rel_path).resolve()
-        return file.load(abs_path, parse_env=parse_env, parse_datetime=parse_datetime, **kwargs)
-
-    YamlLoader.add_constructor('!file', file_constructor)
-    YamlLoader.add_constructor('!datetime', datetime_constructor)
-    YamlLoader.add_constructor('!date', date_constructor)
-    YamlLoader.add_constructor('!merge', merge_constructor)
+        return load_include(abs_path)
 
+    base_class = CYamlLoader if use_libyaml else YamlLoader
+    # add_constructor 只修改子类自己的构造器表
+    loader_class = type(base_class.__name__, (base_class,), {'load_include': staticmethod(load_include)})
+    loader_class.add_constructor('!file', file_constructor)
+    loader_class.add_constructor('!datetime', datetime_constructor)
+    loader_class.add_constructor('!date', date_constructor)
+    loader_class.add_constructor('!merge', merge_constructor)
 
     if parse_env:
-        # YamlLoader.add_constructor('!env', env_constructor)
-        YamlLoader.add_constructor('tag:yaml.org,2002:str', env_var_constructor)
-    return YamlLoader
+        # loader_class.add_constructor('!env', env_constructor)
+        loader_class.add_constructor('tag:yaml.org,2002:str', env_var_constructor)
+    return loader_class
+
+
+def get_yaml_loader(file: "Filez", parse_env=True, parse_datetime=True, use_libyaml=True, **kwargs):
+    """获取 Loader 类, 每个 (Filez 实例, parse_env, parse_datetime) 组合只创建一次, 线程安全
+
+    use_libyaml=True 且安装了 libyaml 时使用 C 加速的 CYamlLoader
+    """
+    use_libyaml = bool(use_libyaml and LIBYAML_AVAILABLE)
+    key = (parse_env, parse_datetime, use_libyaml, tuple(sorted(kwargs.items())))
+    with _LOADER_LOCK:
+        loaders = _LOADER_CACHE.setdefault(file, {})
+        loader_class = loaders.get(key)
+        if loader_class is None:
+            loader_class = loaders[key] = _build_yaml_loader(weakref.ref(file), parse_env, parse_datetime,
+                                                             use_libyaml, **kwargs)
+    return loader_class
@@ -1,10 +1,11 @@
+import os
 from datetime import date, datetime
 from pathlib import Path
 from pprint import pprint
 
 import pytest
 
-from filez import file
+from filez import Filez, file
 
 
 @pytest.fixture
@@ -28,6 +29,46 @@ def test_load_csv(testdata_dir):
     assert data == [{'a': 1, 'b': 2.2, 'c': True}, {'a': 4, 'b': 5, 'c': 6}]
 
 
+def test_iter_csv(testdata_dir):
+    rows = file.load(testdata_dir / 'data.csv', stream=True)
+    assert next(rows) == ['a', 'b', 'c']
+    assert list(rows) == [[1, 2.2, True], [4, 5, 6]]
+
+    data = list(file.iter_csv(testdata_dir / 'data.csv', header=True, parse_value=False))
+    assert data == [{'a': '1', 'b': '2.2', 'c': 'true'}, {'a': '4', 'b': '5', 'c': '6'}]
+
+    chunks = list(file.iter_csv(testdata_dir / 'data.csv', skip=1, chunk_size=2))
+    assert chunks == [[[1, 2.2, True], [4, 5, 6]]]
+    chunks = list(file.iter_csv(testdata_dir / 'data.csv', header=True, chunk_size=1))
+    assert chunks == [[{'a': 1, 'b': 2.2, 'c': True}], [{'a': 4, 'b': 5, 'c': 6}]]
+
+
+def test_load_csv_schema(testdata_dir, tmp_path):
+    data = file.load(testdata_dir / 'data.csv', header=True, infer_schema=True, sample_rows=1)
+    assert data == [{'a': 1, 'b': 2.2, 'c': True}, {'a': 4, 'b': 5.0, 'c': 6}]  # c 转换失败时回退到 cast_value
+
+    csv_file = tmp_path / 'typed.csv'
+    csv_file.write_text('id,price,code,created,note\n'
+                        '1,2,007,2025-06-01 12:30:45,\n'
+                        '2,3.5,010,2025-06-02,null\n')
+    data = file.load(csv_file, header=True, infer_schema=True, schema={'code': str})
+    assert data == [{'id': 1, 'price': 2.0, 'code': '007', 'created': datetime(2025, 6, 1, 12, 30, 45), 'note': None},
+                    {'id': 2, 'price': 3.5, 'code': '010', 'created': datetime(2025, 6, 2), 'note': None}]
+
+    data = file.load(csv_file, skip=1, schema={0: 'str', 1: float})
+    assert data == [['1', 2.0, 7, '2025-06-01 12:30:45', ''], ['2', 3.5, 10, '2025-06-02', None]]
+
+
+def test_load_csv_columnar(testdata_dir):
+    data = file.load(testdata_dir / 'data.csv', header=True, columnar=True)
+    assert list(data) == ['a', 'b', 'c']
+    assert list(data['a']) == [1, 4] and list(data['b']) == [2.2, 5.0] and data['c'] == [True, 6]
+    assert sum(data['a']) == 5
+
+    data = file.load(testdata_dir / 'data.csv', skip=1, columnar=True)
+    assert list(data) == [0, 1, 2] and list(data[0]) == [1, 4]
+
+
 def test_json(testdata_dir):
     data = file.load(testdata_dir / 'data.json', parse_datetime=True)
     assert data == {'birthday': date(1990, 1, 1),
@@ -35,6 +76,101 @@ def test_json(testdata_dir):
                     'name': 'Alice'}
 
 
+def test_datetime_hook(tmp_path):
+    from datetime import timezone, timedelta
+    from filez.json_encoder import parse_iso_datetime
+
+    assert parse_iso_datetime('2025-06-01') == date(2025, 6, 1)
+    assert parse_iso_datetime('2025-06-01 12:30:45.534') == datetime(2025, 6, 1, 12, 30, 45, 534000)
+    assert parse_iso_datetime('2025-06-01T12:30:45Z') == datetime(2025, 6, 1, 12, 30, 45, tzinfo=timezone.utc)
+    assert parse_iso_datetime('2025-06-01T12:30:45+08:00') == datetime(2025, 6, 1, 12, 30, 45,
+                                                                       tzinfo=timezone(timedelta(hours=8)))
+    for value in ('hello', '2025-06-01x', '2025-13-01', '2025-06-01T12:30', '12345-06-01', 'abcd-ef-gh'):
+        assert parse_iso_datetime(value) is None
+
+    har_file = tmp_path / 'example.har'
+    har_file.write_text('{"log": {"entries": [{"startedDateTime": "2025-06-01T12:30:45.123Z",'
+                        ' "request": {"url": "/", "date": "2025-06-01"}}]}}')
+    entry = file.load(har_file, parse_datetime=True, datetime_keys=['startedDateTime'])['log']['entries'][0]
+    assert entry['startedDateTime'] == datetime(2025, 6, 1, 12, 30, 45, 123000, tzinfo=timezone.utc)
+    assert entry['request']['date'] == '2025-06-01'
+    entry = file.load(har_file, parse_datetime=True, datetime_paths=['log.entries.*.request.date'])['log']['entries'][0]
+    assert entry['startedDateTime'] == '2025-06-01T12:30:45.123Z'
+    assert entry['request']['date'] == date(2025, 6, 1)
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson', 'ujson'])
+def test_json_backend(tmp_path, backend):
+    import json
+    from filez.json_backend import get_json_backend
+    try:
+        get_json_backend(backend)
+    except ImportError as e:
+        pytest.skip(str(e))
+    f = Filez()
+    f.json_backend = backend
+    json_file = tmp_path / 'data.json'
+    data = {'name': '张三', 'created_at': datetime(2025, 6, 1, 12, 30, 45, 123000), 'birthday': date(1990, 1, 1),
+            'items': [{'day': date(2025, 6, 1)}, [1, 2.5, None, True]], 'big': 2 ** 70, 'small': -2 ** 63 - 1}
+    f.save_json(data, json_file, indent=2, json_backend=backend)
+    assert f.load(json_file, parse_datetime=True) == data
+    assert f.load(json_file) == json.loads(json_file.read_text())  # 超出 64 位的整数不丢失精度
+    assert f.load(json_file)['created_at'] == '2025-06-01T12:30:45.123000'
+    json_file.write_text('{"value": NaN, "day": "2025-06-01"}')  # 后端不支持时回退到标准库
+    assert f.load(json_file, parse_datetime=True)['day'] == date(2025, 6, 1)
+    with pytest.raises(TypeError):
+        f.save_json({'obj': object()}, json_file, json_backend=backend)
+
+    # 不会保存为 null
+    f.save_json({'values': [float('nan'), float('inf'), -float('inf'), None]}, json_file, json_backend=backend)
+    values = f.load(json_file)['values']
+    assert values[0] != values[0] and values[1:] == [float('inf'), -float('inf'), None]
+
+
+def test_json_backend_auto(tmp_path):
+    json_file = tmp_path / 'data.json'
+    data = {'name': '张三', 'items': [1, 2]}
+    Filez.save_json(data, json_file)  # 默认使用标准库保存, 输出格式与安装的库无关
+    assert json_file.read_text() == '{"name": "\\u5f20\\u4e09", "items": [1, 2]}'
+
+
+def test_json_parse_env(tmp_path, monkeypatch):
+    monkeypatch.setenv('DB_HOST', 'db1')
+    json_file = tmp_path / 'config.json'
+    json_file.write_text('{"db": {"url": "mysql://${DB_HOST}:${DB_PORT:-3306}"}, "hosts": ["${DB_HOST}", 1]}')
+    assert file.load(json_file)['hosts'] == ['${DB_HOST}', 1]  # 默认不替换
+    assert file.load(json_file, parse_env=True) == {'db': {'url': 'mysql://db1:3306'}, 'hosts': ['db1', 1]}
+    assert file.load(json_file, parse_env=True, env={'DB_HOST': 'db2'})['hosts'] == ['db2', 1]
+    fz = Filez()
+    fz.env = {'DB_HOST': 'db3', 'DB_PORT': '3307'}
+    assert fz.load(json_file, parse_env=True)['db']['url'] == 'mysql://db3:3307'
+
+    har_file = tmp_path / 'example.har'
+    har_file.write_text('{"url": "${base}/api/${id}"}')
+    assert file.load(har_file) == {'url': '${base}/api/${id}'}
+    assert file.load(har_file, parse_env=True) == {'url': '${base}/api/${id}'}  # .har/.abi 从不替换
+
+
+def test_jsonl(tmp_path):
+    jsonl_file = tmp_path / 'events.jsonl'
+    events = [{'id': i, 'created_at': datetime(2025, 6, 1, 12, i), 'day': date(2025, 6, i + 1)} for i in range(5)]
+    file.save_jsonl((event for event in events), jsonl_file)
+    with open(jsonl_file, 'a') as f:
+        f.write('\n')  # 空行被跳过
+
+    assert file.load(jsonl_file)[0] == {'id': 0, 'created_at': '2025-06-01T12:00:00', 'day': '2025-06-01'}
+    assert file.load(jsonl_file, parse_datetime=True) == events
+    rows = file.load(jsonl_file, stream=True, parse_datetime=True)
+    assert next(rows) == events[0]
+    assert [len(batch) for batch in file.iter_jsonl(jsonl_file, chunk_size=2)] == [2, 2, 1]
+    assert file.load(jsonl_file, parse_datetime=True, workers=2) == events
+    assert list(file.iter_jsonl(jsonl_file, parse_datetime=True, workers=2, chunk_size=3)) == [events[:3], events[3:]]
+
+    ndjson_file = tmp_path / 'events.ndjson'
+    file.convert(jsonl_file, ndjson_file)
+    assert file.load(ndjson_file) == file.load(jsonl_file)
+
+
 def test_yaml(testdata_dir, monkeypatch):
     monkeypatch.setenv("PASSWORD", "123456")
     monkeypatch.setenv("PORT", "8888")
@@ -58,6 +194,64 @@ def test_yaml(testdata_dir, monkeypatch):
                     'ts_sec': datetime(2024, 6, 1, 17, 30, 45)}
 
 
+def test_yaml_loader_cache(testdata_dir, monkeypatch):
+    monkeypatch.setenv("PORT", "8888")
+    assert file.yaml_loader is file.yaml_loader
+    from filez.yaml_loader import get_yaml_loader
+    assert get_yaml_loader(file, parse_env=False) is not get_yaml_loader(file, parse_env=True)
+    assert get_yaml_loader(Filez()) is not get_yaml_loader(file)
+
+    assert file.load(testdata_dir / 'data.yaml', parse_env=False)['port'] == '${PORT}'
+    assert file.load(testdata_dir / 'data.yaml')['port'] == '8888'  # 参数组合之间互不影响
+
+
+def test_yaml_libyaml(testdata_dir, monkeypatch):
+    monkeypatch.setenv("PORT", "8888")
+    from filez.yaml_loader import LIBYAML_AVAILABLE, CYamlLoader
+    if not LIBYAML_AVAILABLE:
+        pytest.skip('libyaml not installed')
+    assert issubclass(file.yaml_loader, CYamlLoader)
+    for parse_env in [True, False]:
+        data = file.load(testdata_dir / 'data.yaml', parse_env=parse_env, use_libyaml=True)
+        expected = file.load(testdata_dir / 'data.yaml', parse_env=parse_env, use_libyaml=False)
+        assert data == expected
+
+
+def test_yaml_file_include(tmp_path):
+    (tmp_path / 'shared.json').write_text('{"name": "Alice"}')
+    (tmp_path / 'part.yaml').write_text('shared: !file shared.json\n')
+    (tmp_path / 'main.yaml').write_text('a: !file shared.json\nb: !file ./shared.json\n'
+                                        'c: !file part.yaml\nd: [!file part.yaml]\n')
+    fz = Filez()
+    calls = []
+    load_json = fz.load_json
+    fz.load_json = lambda *args, **kwargs: calls.append(args) or load_json(*args, **kwargs)
+
+    expected = {'a': {'name': 'Alice'}, 'b': {'name': 'Alice'},
+                'c': {'shared': {'name': 'Alice'}}, 'd': [{'shared': {'name': 'Alice'}}]}
+    data = fz.load(tmp_path / 'main.yaml')
+    assert data == expected
+    assert len(calls) == 1  # 同一次加载中只解析一次
+    assert data['a'] is not data['b'] and data['c'] is not data['d'][0]  # 每个引用是独立的副本
+    out_file = tmp_path / 'out.yaml'
+    file.convert(tmp_path / 'main.yaml', out_file)
+    assert '&id' not in out_file.read_text()
+
+    (tmp_path / 'other.json').write_text('[1, 2]')
+    (tmp_path / 'many.yaml').write_text('a: !file shared.json\nb: !file other.json\nc: [!file shared.json]\n')
+    assert fz.load(tmp_path / 'many.yaml', include_workers=4) == {'a': {'name': 'Alice'}, 'b': [1, 2],
+                                                                  'c': [{'name': 'Alice'}]}
+    assert len(calls) == 3
+
+    (tmp_path / 'loop_a.yaml').write_text('b: !file loop_b.yaml\n')
+    (tmp_path / 'loop_b.yaml').write_text('a: !file loop_a.yaml\n')
+    from filez.yaml_loader import YamlIncludeError
+    with pytest.raises(YamlIncludeError, match='loop_a.yaml -> .*loop_b.yaml -> .*loop_a.yaml'):
+        fz.load(tmp_path / 'loop_a.yaml')
+    with pytest.raises(YamlIncludeError):
+        fz.load(tmp_path / 'loop_a.yaml', include_workers=2)
+
+
 def test_load_ini(testdata_dir):
     data = file.load_ini(testdata_dir / 'data.ini')
 
@@ -77,6 +271,61 @@ def test_load_ini(testdata_dir):
                            'version': '1'}}
 
 
+def test_load_ini_lazy(testdata_dir, monkeypatch):
+    monkeypatch.setenv('USER', 'superhin')
+    monkeypatch.setenv('DB_HOST', 'db1')
+    data = file.load(testdata_dir / 'data.ini', lazy=True)
+    assert list(data) == ['App', 'db'] and len(data['db']) == 6
+    assert repr(data['db']) == "LazyIniSection('db', resolved=0/6)"
+    assert data['db']['host'] == 'db1'
+    assert data['db']['db_uri'] == 'mysql://superhin:@db1:3306/testdb?charset=utf8'
+    assert data['App']['backends'] is data['App']['backends']  # 解析结果被缓存
+    with pytest.raises(KeyError):
+        data['db']['missing']
+
+    monkeypatch.setenv('DB_HOST', 'db2')
+    assert data['db']['host'] == 'db1'  # 使用加载时的环境变量快照
+    assert data.refresh_env() is True
+    assert data.refresh_env() is False
+    assert data['db']['host'] == 'db2'
+    assert data['db']['db_uri'] == 'mysql://superhin:@db2:3306/testdb?charset=utf8'
+    assert data == file.load_ini(testdata_dir / 'data.ini')
+    assert data.to_dict() == file.load_ini(testdata_dir / 'data.ini')
+
+
+def test_ini_tokenizer(tmp_path):
+    ini_file = tmp_path / 'app.ini'
+    ini_file.write_text('[App]\n'
+                        '# comment\n'
+                        '    ; indented comment\n'
+                        'url = http://example.com/#top ; home page\n'
+                        'quoted = "a ; b # c"  # comment\n'
+                        'escaped = 1\\ ;2\n'
+                        'path: /tmp;/var  \n'
+                        'say = say "hi" # kept\n'
+                        'tail = x" ;kept\n'
+                        'spaced = say "hi"  # comment\n'
+                        'home = "http://a.com/#top" ; 注释\n'
+                        'single = \'a ; b\' # c\n'
+                        'lines =\n'
+                        '    first  # comment\n'
+                        '\n'
+                        '    second\n'
+                        '    "third # 3" ;c\n'
+                        'flag\n')
+    assert file.load_ini(ini_file, parse_value=False) == {'App': {'url': 'http://example.com/#top',
+                                                                  'quoted': '"a ; b # c"',
+                                                                  'escaped': '1\\ ;2',
+                                                                  'path': '/tmp;/var',
+                                                                  'say': 'say "hi" # kept',
+                                                                  'tail': 'x" ;kept',
+                                                                  'spaced': 'say "hi"',
+                                                                  'home': '"http://a.com/#top"',
+                                                                  'single': "'a ; b'",
+                                                                  'lines': '\nfirst\nsecond\n"third # 3"',
+                                                                  'flag': None}}
+
+
 def test_load_xls(testdata_dir):
     data1 = file.load(testdata_dir / 'data.xls')
     assert data1 == [['a', 'b', 'c'], [1.0, 2.2, 0], ['hello', 'world', '']]
@@ -93,6 +342,9 @@ def test_load_xls(testdata_dir):
     data = file.load(testdata_dir / 'data.xls', skip=1, sheets=[1])
     assert data == {'Sheet2': [[1.0, 2.2, 0]]}
 
+    data = file.load(testdata_dir / 'data.xls', header=True, sheets=[1], columnar=True)
+    assert {key: list(value) for key, value in data['Sheet2'].items()} == {'a': [1.0], 'b': [2.2], 'c': [0]}
+
 
 def test_load_xlsx(testdata_dir):
     data1 = file.load(testdata_dir / 'data.xlsx')
@@ -108,6 +360,34 @@ def test_load_xlsx(testdata_dir):
     assert data3 == [{'a': 1, 'b': 2.2, 'c': False},
                      {'a': 'hello', 'b': 'world', 'c': None}], 'single sheet with header'
 
+    data4 = file.load(testdata_dir / 'data.xlsx', header=True, columnar=True)
+    assert data4 == {'a': [1, 'hello'], 'b': [2.2, 'world'], 'c': [False, None]}, 'columnar'
+
+
+def test_load_xlsx_read_only(testdata_dir):
+    data1 = file.load(testdata_dir / 'data.xlsx', read_only=True)
+    assert data1 == [['a', 'b', 'c'], [1, 2.2, False], ['hello', 'world', None]]
+    data2 = file.load(testdata_dir / 'data.xlsx', skip=1, read_only=True)
+    assert data2 == [[1, 2.2, False], ['hello', 'world', None]]
+    data3 = file.load(testdata_dir / 'data.xlsx', header=True, sheets='all', read_only=True)
+    assert data3['Sheet1'] == [{'a': 1, 'b': 2.2, 'c': False}, {'a': 'hello', 'b': 'world', 'c': None}]
+
+    rows = file.load(testdata_dir / 'data.xlsx', header=True, stream=True)
+    assert next(rows) == {'a': 1, 'b': 2.2, 'c': False}
+    rows.close()  # 关闭工作簿
+    rows = file.iter_xlsx(testdata_dir / 'data.xlsx', skip=2, sheets=[0])
+    assert list(rows) == [('Sheet1', ['hello', 'world', None])]
+
+
+def test_load_excel_workers(testdata_dir, monkeypatch):
+    monkeypatch.setattr('filez.excel_parser.PARALLEL_MIN_FILE_SIZE', 0)
+    for name in ['data.xls', 'data.xlsx']:
+        expected = file.load(testdata_dir / name, header=True, sheets='all')
+        data = file.load(testdata_dir / name, header=True, sheets='all', workers=2)
+        assert data == expected and list(data) == list(expected)
+        data = file.load(testdata_dir / name, sheets=[1, 0], workers=2)
+        assert list(data) == ['Sheet2', 'Sheet1']
+
 
 def test_load_xml(testdata_dir):
     data1 = file.load(testdata_dir / 'data.xml')
@@ -141,6 +421,49 @@ def test_load_xml(testdata_dir):
     }
 
 
+def test_load_xml_encoding(tmp_path):
+    xml_file = tmp_path / 'gbk.xml'
+    xml_file.write_bytes('<?xml version="1.0" encoding="GBK"?><root><name>中文</name></root>'.encode('gbk'))
+    assert file.load(xml_file) == {'root': {'name': '中文'}}
+    assert list(file.iter_xml(xml_file, 'name')) == ['中文']
+
+    xml_file.write_bytes('<?xml version="1.0" encoding="ISO-8859-1"?><root><name>café</name></root>'.encode('latin-1'))
+    assert file.load(xml_file) == {'root': {'name': 'café'}}
+
+    xml_file.write_bytes('<root><name>中文</name></root>'.encode('gbk'))  # 无 XML 声明时指定编码
+    assert file.load(xml_file, encoding='gbk') == {'root': {'name': '中文'}}
+    assert list(file.iter_xml(xml_file, 'name', encoding='gbk')) == ['中文']
+
+
+def test_parse_xml_node():
+    from xml.etree import ElementTree
+    from filez.xml_parser import parse_xml_node
+    root = ElementTree.fromstring('<r><i>1</i><i>2</i><i a="x">3</i><j><k>4</k></j><j><k>5</k></j></r>')
+    assert parse_xml_node(root) == {'r': {'i': ['1', '2', {':a': 'x', 'text': '3'}], 'j': [{'k': '4'}, {'k': '5'}]}}
+
+    deep = ElementTree.fromstring('<n>' * 5000 + 'leaf' + '</n>' * 5000)
+    data = parse_xml_node(deep)
+    for _ in range(4999):
+        data = data['n']
+    assert data == {'n': 'leaf'}
+
+
+def test_iter_xml(testdata_dir):
+    books = file.load(testdata_dir / 'data.xml', stream=True, tag='book')
+    assert next(books) == {':category': 'COOKING',
+                           'author': 'Giada De Laurentiis',
+                           'price': '30.00',
+                           'title': {':lang': 'en', 'text': 'Everyday Italian'},
+                           'year': '2005'}
+    assert next(books)['author'] == 'Erik T. Ray'
+    assert next(books, None) is None
+
+    titles = list(file.iter_xml(testdata_dir / 'data.xml', '/bookstore/book/title', ignore_attrs=True))
+    assert titles == ['Everyday Italian', 'Learning XML']
+    assert list(file.iter_xml(testdata_dir / 'data.xml', '/book')) == []
+    assert list(file.iter_xml(testdata_dir / 'data.xml', '*/year')) == ['2005', '2003']
+
+
 def test_load_html(testdata_dir):
     data = file.load(testdata_dir / 'data.html')
     assert data == {
@@ -157,6 +480,94 @@ def test_load_html(testdata_dir):
                 ], 'text': ''}]}
 
 
+def test_html_parser_recovery():
+    def parse(html):
+        parser = file.html_parser()
+        parser.feed(html)
+        parser.close()
+        return parser.data
+
+    def tree(node):
+        return [node['tag'], node['text'], [tree(child) for child in node['children']]] if node['children'] \
+            else [node['tag'], node['text']]
+
+    assert tree(parse('<ul><li>a<li>b<p>c<li>d</ul>')) == \
+           ['ul', '', [['li', 'a'], ['li', 'b', [['p', 'c']]], ['li', 'd']]]
+    assert tree(parse('<table><tr><td>1<td>2<tr><td>3</table>')) == \
+           ['table', '', [['tr', '', [['td', '1'], ['td', '2']]], ['tr', '', [['td', '3']]]]]
+    assert tree(parse('<div><p>a<p>b<div>c</div></span></div>')) == \
+           ['div', '', [['p', 'a'], ['p', 'b'], ['div', 'c']]]
+    assert tree(parse('<p>Hello <b>world</b> again</p>')) == ['p', 'Hello again', [['b', 'world']]]
+    assert parse('</div></p>') is None  # 没有对应开始标签的结束标签被忽略
+    assert tree(parse('<div><span>unclosed')) == ['div', '', [['span', 'unclosed']]]
+
+
+def test_html_parser_fuzz():
+    import random
+    tags = ['div', 'p', 'li', 'ul', 'td', 'tr', 'table', 'span', 'b', 'br', 'option', 'select']
+    rnd = random.Random(0)
+    for _ in range(200):
+        html = ''.join(rnd.choice([f'<{rnd.choice(tags)}>', f'</{rnd.choice(tags)}>', 'text ', '<br/>'])
+                       for _ in range(rnd.randint(0, 200)))
+        parser = file.html_parser()
+        parser.feed(html)
+        parser.close()
+        assert not parser.stack
+
+    class CountingParser(file.html_parser):
+        """统计出栈的元素数及查找未关闭元素位置的次数"""
+        def __init__(self):
+            super().__init__()
+            self.operations = 0
+
+        def _pop(self):
+            self.operations += 1
+            super()._pop()
+
+        def _last_position(self, tags):
+            self.operations += 1
+            return super()._last_position(tags)
+
+    def count(html):
+        parser = CountingParser()
+        parser.feed(html)
+        parser.close()
+        return parser.operations
+
+    for pattern in ['<div>', '<li><ul><i></li>', '<span></div>', '<p><table><td>']:
+        small, large = count(pattern * 1000), count(pattern * 10000)
+        assert large <= small * 10, pattern  # 操作数与输入规模成正比 (耗时见 benchmarks/bench_html_parser.py)
+
+
+def test_load_html_compact(testdata_dir):
+    expected = file.load(testdata_dir / 'data.html')
+    data = file.load(testdata_dir / 'data.html', compact=True)
+    form = data['body'][2]
+    assert form.tag == 'form' and form.text == '' and form.children[0].children is None
+    assert data['head'][1].attrs is None
+    assert {key: [node.to_dict() for node in nodes] for key, nodes in data.items()} == expected
+
+    forms = list(file.iter_html(testdata_dir / 'data.html', 'form', compact=True))
+    assert forms[0].to_dict() == expected['body'][2]
+
+
+def test_iter_html(testdata_dir):
+    expected = file.load(testdata_dir / 'data.html')
+    assert file.load(testdata_dir / 'data.html', chunk_size=7) == expected  # 分块输入结果一致
+
+    inputs = list(file.load(testdata_dir / 'data.html', stream=True, tag='input', chunk_size=16))
+    assert inputs == [{'tag': 'input', 'attrs': {'name': 'username', 'type': 'text'}, 'children': [], 'text': ''},
+                      {'tag': 'input', 'attrs': {'type': 'submit'}, 'children': [], 'text': ''}]
+    forms = list(file.iter_html(testdata_dir / 'data.html', attrs={'method': 'post', 'name': None}))
+    assert [form['tag'] for form in forms] == ['form'] and len(forms[0]['children']) == 2
+    assert [p['text'] for p in file.iter_html(testdata_dir / 'data.html', 'p', chunk_size=3)] == ['内容']
+
+    found = []
+    parser = file.html_parser(select_tag='title', callback=found.append)
+    parser.feed((testdata_dir / 'data.html').read_text())
+    assert found == [{'tag': 'title', 'attrs': {}, 'children': [], 'text': 'Title'}]
+
+
 def test_load_properties(testdata_dir):
     data = file.load(testdata_dir / 'data.properties')
     assert data == {'appId': 'cactus',
@@ -252,6 +663,80 @@ def test_convert(testdata_dir, monkeypatch, tmpdir):
                         'ts_sec': datetime(2024, 6, 1, 17, 30, 45)}
 
 
+def test_load_cache(testdata_dir, tmp_path, monkeypatch):
+    fz = Filez()
+    cache = fz.enable_cache(max_entries=2)
+    json_file = tmp_path / 'data.json'
+    json_file.write_text('{"a": [1, 2]}')
+
+    data = fz.load(json_file)
+    data['a'].append(3)  # 修改返回值不影响缓存
+    assert fz.load(json_file) == {'a': [1, 2]}
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    fz.load(json_file, parse_datetime=True)  # 参数不同
+    assert cache.stats()['misses'] == 2
+
+    json_file.write_text('{"a": [1, 2, 3, 4]}')  # 文件变化
+    assert fz.load(json_file) == {'a': [1, 2, 3, 4]}
+    assert len(cache) == 2
+
+    monkeypatch.setenv('PORT', '8888')
+    assert fz.load(testdata_dir / 'data.yaml')['port'] == '8888'
+    monkeypatch.setenv('PORT', '9999')  # 环境变量变化
+    assert fz.load(testdata_dir / 'data.yaml')['port'] == '9999'
+    assert fz.load(testdata_dir / 'data.yaml', cache=False)['port'] == '9999'
+    assert cache.stats()['hits'] == 3  # !file 引用的 data.json 不替换环境变量, 两次都命中缓存
+
+    (tmp_path / 'b.json').write_text('{"v": 1}')
+    (tmp_path / 'part.yaml').write_text('b: !file b.json\n')
+    (tmp_path / 'a.yaml').write_text('part: !file part.yaml\n')
+    assert fz.load(tmp_path / 'a.yaml') == {'part': {'b': {'v': 1}}}
+    (tmp_path / 'b.json').write_text('{"v": 22}')  # 间接引用的文件变化
+    assert fz.load(tmp_path / 'a.yaml') == {'part': {'b': {'v': 22}}}
+
+    hits = cache.stats()['hits']
+    monkeypatch.setenv('UNRELATED_VAR', '1')  # 文件未引用的环境变量变化不影响缓存
+    fz.load(testdata_dir / 'data.yaml')
+    fz.load(testdata_dir / 'data.csv')
+    monkeypatch.setenv('UNRELATED_VAR', '2')
+    fz.load(testdata_dir / 'data.yaml')
+    fz.load(testdata_dir / 'data.csv')
+    assert cache.stats()['hits'] == hits + 2
+
+
+def test_load_disk_cache(testdata_dir, tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    fz = Filez()
+    cache = fz.enable_disk_cache(cache_dir)
+    data = fz.load(testdata_dir / 'data.csv', header=True)
+    assert fz.load(testdata_dir / 'data.csv', header=True) == data
+    assert cache.stats()['hits'] == 1 and cache.stats()['entries'] == 1
+
+    other = Filez()  # 模拟进程重启
+    other.enable_disk_cache(cache_dir)
+    assert other.load(testdata_dir / 'data.csv', header=True) == data
+    assert other.disk_cache.hits == 1
+
+    next(cache_dir.glob('*.pickle')).write_bytes(b'broken')  # 缓存文件损坏时重新解析
+    assert fz.load(testdata_dir / 'data.csv', header=True) == data
+
+    fz.disk_cache.evict(max_bytes=0)
+    assert cache.stats()['entries'] == 0
+
+    monkeypatch.setenv('HOSTNAME', 'pod-1')
+    fz.load(testdata_dir / 'data.csv', header=True)
+    monkeypatch.setenv('HOSTNAME', 'pod-2')  # 不替换环境变量的文件类型与环境变量无关
+    fz.load(testdata_dir / 'data.csv', header=True)
+    assert cache.stats()['hits'] == 2
+
+    (tmp_path / 'b.json').write_text('{"v": 1}')
+    (tmp_path / 'a.yaml').write_text('b: !file b.json\n')
+    assert fz.load(tmp_path / 'a.yaml') == {'b': {'v': 1}}
+    (tmp_path / 'b.json').write_text('{"v": 22}')
+    assert other.load(tmp_path / 'a.yaml') == {'b': {'v': 22}}
+
+
 @pytest.mark.skip('fixme')
 def test_load_pem(testdata_dir):
     # data = file.load(testdata_dir / 'cert.pem')
@@ -280,3 +765,60 @@ def test_load_pem(testdata_dir):
 
     data = file.load(testdata_dir / 'sm2_private_key.pem')
     pprint(data)  # fixme
+
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_watch(tmp_path, use_inotify):
+    import queue
+    import time
+    (tmp_path / 'base.json').write_text('{"host": "a"}')
+    (tmp_path / 'app.yaml').write_text('name: app\nbase: !file base.json\n')
+    (tmp_path / 'app.ini').write_text('[s]\nk = 1\n')
+    events = queue.Queue()
+    watcher = file.watch([tmp_path / 'app.yaml', tmp_path / 'app.ini'],
+                         lambda path, data, diff: events.put((os.path.basename(path), data, diff)),
+                         debounce=0.05, interval=0.02, use_inotify=use_inotify)
+    try:
+        assert list(watcher.data.values()) == [{'name': 'app', 'base': {'host': 'a'}}, {'s': {'k': 1}}]
+        time.sleep(0.05)
+        for i in range(5):  # 连续写入只重新解析一次
+            (tmp_path / 'base.json').write_text('{"host": "b%d"}' % i)
+        assert events.get(timeout=5) == ('app.yaml', {'name': 'app', 'base': {'host': 'b4'}},
+                                         {'added': {}, 'removed': {}, 'changed': {('base', 'host'): ('a', 'b4')}})
+        (tmp_path / 'app.ini').write_text('[s]\nk = 2\nj = 3\n')
+        assert events.get(timeout=5) == ('app.ini', {'s': {'k': 2, 'j': 3}},
+                                         {'added': {('s', 'j'): 3}, 'removed': {}, 'changed': {('s', 'k'): (1, 2)}})
+        time.sleep(0.2)
+        assert events.empty()
+    finally:
+        watcher.stop()
+    watcher.stop()  # 重复调用无副作用
+
+    import threading
+    with file.watch([tmp_path / 'app.ini'], lambda *args: None, interval=0.02, use_inotify=use_inotify) as watcher:
+        assert watcher.start() is watcher
+        assert [t.name for t in threading.enumerate()].count('filez-watcher') == 1  # 不会启动第二个监听线程
+    assert not watcher._thread.is_alive()
+    watcher.stop()
+
+    with watcher:  # 停止后可以重新开始监听
+        time.sleep(0.05)
+        (tmp_path / 'app.ini').write_text('[s]\nk = 4\n')
+        for _ in range(250):
+            if watcher.data[os.path.realpath(tmp_path / 'app.ini')] == {'s': {'k': 4}}:
+                break
+            time.sleep(0.02)
+        assert watcher.data[os.path.realpath(tmp_path / 'app.ini')] == {'s': {'k': 4}}
+
+
+def test_load_many(testdata_dir):
+    paths = [testdata_dir / name for name in ('data.json', 'missing.yaml', 'data.xlsx', 'data.yaml', 'data.ini')]
+    results = file.load_many(paths, workers=2)
+    assert [path for path, _, _ in results] == [str(path) for path in paths]
+    assert results[0][1] == file.load(paths[0]) and results[0][2] is None
+    assert results[1][1] is None and isinstance(results[1][2], FileNotFoundError)
+    assert results[2][1] == file.load(paths[2])  # xlsx 在进程池中加载
+    assert results[3][1] == file.load(paths[3]) and results[4][1] == file.load(paths[4])
+    assert sorted(path for path, _, _ in file.load_many(paths, ordered=False)) == sorted(map(str, paths))
+    results = file.load_many(paths[:1] + paths[3:], executor='process', parse_datetime=True)
+    assert [data for _, data, _ in results] == [file.load(path, parse_datetime=True) for path in paths[:1] + paths[3:]]
@@ -1,6 +1,7 @@
 from collections import OrderedDict
 
-from filez.utils import cast_value, cast_dict_value
+from filez.env import compile_template, env_scope, snapshot_env, substitute_env, substitute_env_in
+from filez.utils import cast_value, cast_dict_value, diff_data, to_columns
 
 
 def test_auto_cast():
@@ -11,6 +12,57 @@ def test_auto_cast():
     assert cast_value('~') is None
 
 
+def test_auto_cast_container():
+    assert cast_value('[1, 2.5, true, null]') == [1, 2.5, True, None]
+    assert cast_value('{"a": [1, 2]}') == {'a': [1, 2]}
+    assert cast_value('{k: v, n: 1}') == {'k': 'v', 'n': 1}  # 非 json 回退至 yaml
+    assert cast_value('[1e5]') == ['1e5']
+    assert cast_value('a, 1 ,off') == ['a', 1, False]
+    # 缓存不共享可变结果
+    cast_value('[1]').append(2)
+    assert cast_value('[1]') == [1]
+
+
 def test_cast_dict_value():
     assert cast_dict_value({'a': '1', 'b': 'null'}) == {'a': 1, 'b': None}
     assert cast_dict_value({'a': '1', 'b': 'null'}, ordered_dict=True) == OrderedDict([('a', 1), ('b', None)])
+
+
+def test_to_columns():
+    data = to_columns([[1, 2, 'a'], [3, 4.5, 'b'], [2 ** 70, 5]])
+    assert data[0] == [1, 3, 2 ** 70]  # 超出 int64 时降级为 list
+    assert list(data[1]) == [2.0, 4.5, 5.0]
+    assert data[2] == ['a', 'b', None]
+    data = to_columns([{'a': 1}, {'a': 2, 'b': 3}])
+    assert list(data) == ['a'] and list(data['a']) == [1, 2]
+    assert to_columns([], headers=['a']) == {'a': []}
+
+
+def test_substitute_env(monkeypatch):
+    monkeypatch.setenv('HOST', 'db1')
+    monkeypatch.delenv('PORT', raising=False)
+    assert substitute_env('mysql://${HOST}:${PORT:-3306}/${DB}') == 'mysql://db1:3306/'
+    assert compile_template('mysql://${HOST}:${PORT:-3306}/${DB}') == ('mysql://', ('HOST', ''), ':',
+                                                                       ('PORT', '3306'), '/', ('DB', ''))
+    text = 'no variables'
+    assert substitute_env(text) is text
+    assert substitute_env('${HOST}', {'HOST': 'db2'}) == 'db2'
+
+    env = snapshot_env()
+    monkeypatch.setenv('HOST', 'db3')
+    assert env['HOST'] == 'db1' and snapshot_env(env) is env
+    with env_scope(env):
+        with env_scope() as inner:  # 嵌套时沿用外层快照
+            assert inner is env
+            assert substitute_env('${HOST}') == 'db1'
+    assert substitute_env('${HOST}') == 'db3'
+    assert substitute_env_in({'a': ['${HOST}', 1, {'b': '${PORT:-80}'}]}) == {'a': ['db3', 1, {'b': '80'}]}
+
+
+def test_diff_data():
+    old = {'a': 1, 'b': {'c': [1, 2, 3]}, 'd': 'x'}
+    new = {'a': 1.0, 'b': {'c': [1, 5]}, 'e': None}
+    assert diff_data(old, new) == {'added': {('e',): None},
+                                   'removed': {('d',): 'x', ('b', 'c', 2): 3},
+                                   'changed': {('a',): (1, 1.0), ('b', 'c', 1): (2, 5)}}
+    assert diff_data(old, old) == {'added': {}, 'removed': {}, 'changed': {}}